@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of the API metrics middleware.
+
+Runs an in-process FastAPI app (no network, no database) through
+httpx.ASGITransport and reports the mean time per request for:
+
+  baseline        no middleware
+  base_http       an empty @app.middleware("http") (BaseHTTPMiddleware),
+                  i.e. the wrapper cost the old middleware paid before
+                  doing any work
+  base_http+work  api.middleware.MetricsMiddleware's work run inside
+                  BaseHTTPMiddleware (the old setup)
+  asgi            api.middleware.MetricsMiddleware (the current setup)
+
+Usage: PYTHONPATH=src python scripts/bench_middleware.py [requests]
+"""
+
+import asyncio
+import logging
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+
+# Real (non-exporting) spans, so span creation cost is included
+trace.set_tracer_provider(TracerProvider())
+
+from api.middleware import MetricsMiddleware  # noqa: E402
+
+class NullLogger:
+    def info(self, msg, **kwargs):
+        pass
+
+    def error(self, msg, **kwargs):
+        pass
+
+def make_app(mode):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    if mode == "base_http":
+        @app.middleware("http")
+        async def passthrough(request, call_next):
+            return await call_next(request)
+    elif mode == "base_http+work":
+        # Put MetricsMiddleware behind a BaseHTTPMiddleware so the same
+        # recording work also pays the BaseHTTPMiddleware wrapper cost
+        app.add_middleware(MetricsMiddleware, logger=NullLogger())
+
+        @app.middleware("http")
+        async def passthrough(request, call_next):
+            return await call_next(request)
+    elif mode == "asgi":
+        app.add_middleware(MetricsMiddleware, logger=NullLogger())
+    return app
+
+async def run(mode, requests):
+    transport = httpx.ASGITransport(app=make_app(mode))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(200):  # warm up
+            await client.get(f"/items/{i}")
+        start = time.perf_counter()
+        for i in range(requests):
+            await client.get(f"/items/{i}")
+        return (time.perf_counter() - start) / requests
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    logging.disable(logging.CRITICAL)
+    results = {}
+    for mode in ("baseline", "base_http", "base_http+work", "asgi"):
+        results[mode] = await run(mode, requests)
+    baseline = results["baseline"]
+    print(f"{'mode':<16}{'us/request':>12}{'overhead us':>14}")
+    for mode, per_request in results.items():
+        print(f"{mode:<16}{per_request * 1e6:>12.1f}{(per_request - baseline) * 1e6:>14.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
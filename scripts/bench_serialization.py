@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of a GET /products page, per 10k rows.
+
+Loads the rows from an in-memory SQLite catalog (no Postgres needed) and
+times only the step from query result to response body bytes:
+
+  orm+jsonable_encoder  ORM instances through jsonable_encoder and
+                        JSONResponse (what the route did before)
+  orm+response_model    ORM instances validated into List[ProductOut]
+                        and dumped by pydantic
+  rows+fast_json        column rows -> dicts -> FastJSONResponse
+                        (the current list endpoints)
+
+Usage: PYTHONPATH=src python scripts/bench_serialization.py [rows] [repeats]
+"""
+
+import sys
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from api.database import Base
+from api.models import Product
+from api.responses import FastJSONResponse
+from api.routes import ProductOut, _as_dicts
+
+def load(rows):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Product.__table__])
+    with Session(engine) as db:
+        db.execute(insert(Product), [{"name": f"record {i}", "price": i * 0.5} for i in range(rows)])
+        db.commit()
+        orm_rows = db.scalars(select(Product).order_by(Product.id)).all()
+        result = db.execute(select(Product.id, Product.name, Product.price).order_by(Product.id))
+        column_rows = (result.keys(), result.all())
+        # Load every attribute before the session closes
+        for product in orm_rows:
+            product.name
+    return orm_rows, column_rows
+
+def best_of(repeats, fn):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    orm_rows, column_rows = load(rows)
+    adapter = TypeAdapter(List[ProductOut])
+
+    modes = {
+        "orm+jsonable_encoder": lambda: JSONResponse(jsonable_encoder(orm_rows)).body,
+        "orm+response_model": lambda: adapter.dump_json(adapter.validate_python(orm_rows, from_attributes=True)),
+        "rows+fast_json": lambda: FastJSONResponse(_as_dicts(*column_rows)).body,
+    }
+    scale = 10_000 / rows
+    print(f"{rows} rows, best of {repeats}")
+    print(f"{'mode':<22}{'ms/10k rows':>12}{'bytes':>10}")
+    for mode, fn in modes.items():
+        seconds, size = best_of(repeats, fn)
+        print(f"{mode:<22}{seconds * 1000 * scale:>12.2f}{size:>10}")
+
+if __name__ == "__main__":
+    main()
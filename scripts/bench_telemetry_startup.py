@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for api.telemetry.setup_telemetry().
+
+Each run happens in a fresh interpreter, because setup only happens once
+per process. The OTLP endpoint is unreachable on purpose: that is the
+case that used to add up to 1.5s to every API and worker boot. The
+script exits non-zero if the median setup time exceeds the target, so
+it can run as a CI gate.
+
+Usage: PYTHONPATH=src python scripts/bench_telemetry_startup.py [--runs 5] [--target-ms 200]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import os, time
+import api.telemetry as telemetry
+start = time.perf_counter()
+telemetry.setup_telemetry("startup-benchmark")
+print((time.perf_counter() - start) * 1000, flush=True)
+# Skip exporter shutdown retries against the unreachable endpoint
+os._exit(0)
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=200.0)
+    parser.add_argument("--endpoint", default="http://otlp-unreachable.invalid:4317")
+    args = parser.parse_args()
+
+    env = dict(os.environ, OTEL_EXPORTER_OTLP_ENDPOINT=args.endpoint)
+    timings = []
+    for _ in range(args.runs):
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD],
+            env=env, capture_output=True, text=True, timeout=60, check=True
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+
+    median = statistics.median(timings)
+    print(f"setup_telemetry(): median {median:.1f} ms, max {max(timings):.1f} ms "
+          f"over {args.runs} runs (target {args.target_ms:.0f} ms)")
+    sys.exit(0 if median <= args.target_ms else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+In-process caches for the API.
+
+TTLCache is a small thread-safe LRU cache with per-entry expiry. Each
+instance reports hits, misses, evictions and size under its own `cache`
+label so the caches can be compared on one dashboard.
+
+VersionCounter is a monotonic per-dataset version bumped on every write,
+used to build strong ETags and cache keys without reading the data
+itself. It lives in the configured cache backend (api/cache_backend.py),
+so with CACHE_BACKEND=redis every replica sees the same version.
+
+SingleFlightCache is the asyncio-side response cache: concurrent misses
+for one key share a single fetch, and expired entries can be served
+stale while they are refreshed or while the backend is failing. With a
+shared backend it also keeps a second tier there, so one replica's fetch
+warms the others.
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple, Optional, Tuple
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+
+from opentelemetry import context as otel_context
+
+from api.cache_backend import CacheBackend, cache_backend, _version_seed
+from api.logging_config import StructuredLogger
+from api.metrics import cache_requests_total, cache_evictions_total, cache_entries, cache_backend_errors_total
+
+PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "10000"))
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "60"))
+
+# GET /products page cache: fresh for TTL, then served stale for up to
+# STALE_WHILE_REVALIDATE more seconds while one background fetch refreshes
+# it; if a fetch fails, entries up to STALE_IF_ERROR seconds past expiry
+# (or superseded by a write) are served instead of the error.
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024"))
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "5"))
+CATALOG_CACHE_STALE_WHILE_REVALIDATE_SECONDS = float(
+    os.getenv("CATALOG_CACHE_STALE_WHILE_REVALIDATE_SECONDS", "30")
+)
+CATALOG_CACHE_STALE_IF_ERROR_SECONDS = float(os.getenv("CATALOG_CACHE_STALE_IF_ERROR_SECONDS", "300"))
+# Lifetime of pages in a shared backend. Keys carry the catalog version, so
+# this only bounds memory and writes made outside the API.
+CATALOG_SHARED_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_SHARED_CACHE_TTL_SECONDS", "300"))
+
+logger = StructuredLogger(__name__)
+
+_MISSING = object()
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, name: str, max_entries: int, ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Bind labelled children once instead of resolving labels per call
+        self._hits = cache_requests_total.labels(cache=name, result="hit")
+        self._misses = cache_requests_total.labels(cache=name, result="miss")
+        self._size = cache_entries.labels(cache=name)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self._hits.inc()
+                    return value
+                del self._data[key]
+                cache_evictions_total.labels(cache=self.name, reason="expired").inc()
+                self._size.set(len(self._data))
+        self._misses.inc()
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                cache_evictions_total.labels(cache=self.name, reason="capacity").inc()
+            self._size.set(len(self._data))
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                cache_evictions_total.labels(cache=self.name, reason="invalidated").inc()
+                self._size.set(len(self._data))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size.set(0)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class _Entry(NamedTuple):
+    value: Any
+    version: int
+    expires_at: float
+
+class SingleFlightCache:
+    """
+    Bounded LRU cache for async loaders with request coalescing.
+
+    get_or_fetch() returns a fresh entry when it has one. Otherwise exactly
+    one fetch per (key, version) runs and every concurrent caller awaits
+    that same task, so an expiry or invalidation costs one backend query
+    however many requests arrive at once.
+
+    `version` ties entries to a VersionCounter: an entry stored under an
+    older version is never served as a hit or during revalidation (reads
+    see their writes), only as a stale-if-error fallback.
+
+    When `backend` is shared (Redis), a fetch first looks for the page
+    under the versioned key there and stores what it loads, with
+    `encode`/`decode` converting values to and from bytes. Backend errors
+    only cost a trip to the loader.
+
+    Meant to be used from a single event loop (one per worker process).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl: float,
+        stale_while_revalidate: float = 0.0,
+        stale_if_error: float = 0.0,
+        backend: Optional[CacheBackend] = None,
+        shared_ttl: float = 0.0,
+        encode: Optional[Callable[[Any], bytes]] = None,
+        decode: Optional[Callable[[bytes], Any]] = None,
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        # A process-local backend would only hold a second copy of _data
+        self.backend = backend if backend is not None and backend.shared else None
+        self.shared_ttl = shared_ttl
+        self.encode = encode
+        self.decode = decode
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._results = {
+            result: cache_requests_total.labels(cache=name, result=result)
+            for result in ("hit", "stale", "stale_if_error", "coalesced", "miss")
+        }
+        self._size = cache_entries.labels(cache=name)
+        if self.backend is not None:
+            self._shared_hits = cache_requests_total.labels(cache=f"{name}_shared", result="hit")
+            self._shared_misses = cache_requests_total.labels(cache=f"{name}_shared", result="miss")
+
+    async def get_or_fetch(
+        self, key: Hashable, version: int, fetch: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, str]:
+        """Return (value, result) where result is the metric label that served it."""
+        now = time.monotonic()
+        entry = self._data.get(key)
+        if entry is not None and entry.version == version:
+            if now < entry.expires_at:
+                self._data.move_to_end(key)
+                return self._served(entry.value, "hit")
+            if now < entry.expires_at + self.stale_while_revalidate:
+                self._data.move_to_end(key)
+                self._flight(key, version, fetch, background=True)
+                return self._served(entry.value, "stale")
+
+        task, leader = self._flight(key, version, fetch)
+        try:
+            # shield: a caller that disconnects must not cancel the fetch
+            # the other waiters are sharing
+            value = await asyncio.shield(task)
+        except Exception:
+            if entry is not None and now < entry.expires_at + self.stale_if_error:
+                return self._served(entry.value, "stale_if_error")
+            raise
+        return self._served(value, "miss" if leader else "coalesced")
+
+    def _served(self, value: Any, result: str) -> Tuple[Any, str]:
+        self._results[result].inc()
+        return value, result
+
+    def _flight(self, key: Hashable, version: int, fetch, background: bool = False) -> Tuple[asyncio.Future, bool]:
+        flight_key = (key, version)
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            return task, False
+        context = contextvars.copy_context()
+        if background:
+            # The triggering request usually finishes before the refresh, so
+            # its spans must not be the refresh's parent (or, when span levels
+            # are disabled, the span it writes attributes to): start a new trace
+            context.run(otel_context.attach, otel_context.Context())
+        task = asyncio.get_running_loop().create_task(self._load(key, version, fetch), context=context)
+        self._inflight[flight_key] = task
+        task.add_done_callback(lambda t: self._finish(flight_key, t))
+        return task, True
+
+    def _finish(self, flight_key, task: asyncio.Future) -> None:
+        self._inflight.pop(flight_key, None)
+        # Background revalidations have no awaiter; mark the error retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, key: Hashable, version: int, fetch) -> Any:
+        if self.backend is None or not self.backend.available():
+            value = await fetch()
+        else:
+            value = await self._load_shared(key, version, fetch)
+        current = self._data.get(key)
+        # A slower fetch for an older version must not replace a newer entry
+        if current is None or current.version <= version:
+            self._data[key] = _Entry(value, version, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                cache_evictions_total.labels(cache=self.name, reason="capacity").inc()
+            self._size.set(len(self._data))
+        return value
+
+    async def _load_shared(self, key: Hashable, version: int, fetch) -> Any:
+        shared_key = self.backend.key(self.name, version, *key)
+        try:
+            raw = await self.backend.get(shared_key)
+        except Exception as e:
+            _backend_error(self.backend, "get", e)
+            raw = None
+        else:
+            self.backend.mark_up()
+        if raw is not None:
+            self._shared_hits.inc()
+            return self.decode(raw)
+        self._shared_misses.inc()
+        value = await fetch()
+        try:
+            await self.backend.set(shared_key, self.encode(value), self.shared_ttl)
+        except Exception as e:
+            _backend_error(self.backend, "set", e)
+        return value
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._size.set(0)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+def _backend_error(backend: CacheBackend, operation: str, error: Exception) -> None:
+    backend.mark_down()
+    cache_backend_errors_total.labels(backend=backend.name, operation=operation).inc()
+    logger.warning(
+        "cache_backend_error",
+        backend=backend.name,
+        cache_operation=operation,
+        error=str(error),
+        error_type=type(error).__name__
+    )
+
+class VersionCounter:
+    """
+    Monotonic version of a dataset, bumped after every committed write.
+
+    Stored in a CacheBackend under "<namespace>:version:<name>". New
+    counters start from a clock-based seed (see cache_backend), so a
+    restarted process or a flushed Redis never reissues an old version.
+
+    While the backend is unreachable (or its circuit breaker is open) the
+    counter continues locally from the last version it read, so ETags and
+    cached pages keep working and only local writes change the version.
+    The first successful call afterwards moves the backend past every
+    local version, bumping it once more if writes happened meanwhile.
+    """
+
+    def __init__(self, name: str, backend: CacheBackend):
+        self.name = name
+        self.backend = backend
+        self._key = backend.key("version", name)
+        self._last_version = None
+        # Version handed out while the backend was unreachable, and whether
+        # it was bumped by a local write
+        self._local_version = None
+        self._local_bumped = False
+
+    async def current(self) -> int:
+        if self.backend.available():
+            try:
+                version = await self.backend.get_version(self._key)
+                if self._local_version is not None:
+                    version = await self._reconcile(version)
+            except Exception as e:
+                _backend_error(self.backend, "get_version", e)
+            else:
+                return self._backend_version(version)
+        return self._fallback()
+
+    async def bump(self) -> int:
+        if self.backend.available():
+            try:
+                if self._local_version is not None:
+                    await self._reconcile(await self.backend.get_version(self._key))
+                version = await self.backend.bump_version(self._key)
+            except Exception as e:
+                _backend_error(self.backend, "bump_version", e)
+            else:
+                return self._backend_version(version)
+        self._local_version = self._fallback() + 1
+        self._local_bumped = True
+        return self._local_version
+
+    def _backend_version(self, version: int) -> int:
+        self.backend.mark_up()
+        self._last_version = version
+        return version
+
+    def _fallback(self) -> int:
+        if self._local_version is None:
+            self._local_version = self._last_version if self._last_version is not None else _version_seed()
+        return self._local_version
+
+    async def _reconcile(self, version: int) -> int:
+        local_version, local_bumped = self._local_version, self._local_bumped
+        # Local writes must invalidate other replicas' pages, and later
+        # versions must sort above the local ones: SingleFlightCache never
+        # replaces an entry with one stored under a lower version
+        if local_bumped or version < local_version:
+            version = await self.backend.bump_version(self._key, max(local_version + 1 - version, 1))
+        # Unless another local write happened while we were awaiting
+        if (self._local_version, self._local_bumped) == (local_version, local_bumped):
+            self._local_version = None
+            self._local_bumped = False
+        return version
+
+    def etag(self, version: int) -> str:
+        """Strong ETag for `version`, quoted for the header."""
+        return f'"{self.name}-{version}"'
+
+class CachedProduct(NamedTuple):
+    """Detached snapshot of a Product row, safe to share across requests."""
+    id: int
+    name: str
+    price: float
+
+class CatalogPage(NamedTuple):
+    """A rendered GET /products page as stored in catalog_page_cache."""
+    body: bytes
+    count: int
+    next_cursor: Optional[int]
+    etag: str
+
+def encode_catalog_page(page: CatalogPage) -> bytes:
+    # One JSON header line, then the body as rendered
+    header = json.dumps([page.count, page.next_cursor, page.etag]).encode()
+    return header + b"\n" + page.body
+
+def decode_catalog_page(raw: bytes) -> CatalogPage:
+    header, _, body = raw.partition(b"\n")
+    count, next_cursor, etag = json.loads(header)
+    return CatalogPage(body, count, next_cursor, etag)
+
+# Product lookups for checkout / order creation (product id -> CachedProduct)
+product_cache = TTLCache("product", PRODUCT_CACHE_MAX_ENTRIES, PRODUCT_CACHE_TTL_SECONDS)
+
+# Version of the whole catalog (GET /products), bumped on every product write
+catalog_version = VersionCounter("catalog", cache_backend)
+
+# Rendered GET /products pages ((after, limit) -> page), keyed to catalog_version
+catalog_page_cache = SingleFlightCache(
+    "catalog_page",
+    CATALOG_CACHE_MAX_ENTRIES,
+    CATALOG_CACHE_TTL_SECONDS,
+    stale_while_revalidate=CATALOG_CACHE_STALE_WHILE_REVALIDATE_SECONDS,
+    stale_if_error=CATALOG_CACHE_STALE_IF_ERROR_SECONDS,
+    backend=cache_backend,
+    shared_ttl=CATALOG_SHARED_CACHE_TTL_SECONDS,
+    encode=encode_catalog_page,
+    decode=decode_catalog_page,
+)
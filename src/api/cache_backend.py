@@ -0,0 +1,225 @@
+"""
+Cache backends shared by the API's caches.
+
+CacheBackend is a small async, bytes-in/bytes-out interface: get/set with
+a TTL, delete, and versions for version-based invalidation. Every key is
+built with key(), which prefixes CACHE_NAMESPACE, so several apps or
+environments can share one server.
+
+  memory  MemoryCacheBackend, a bounded per-process store (default when
+          running outside docker-compose). Nothing is shared, so it only
+          suits a single API process; see MemoryCacheBackend.
+  redis   RedisCacheBackend, for any server speaking the Redis protocol
+          (CACHE_REDIS_URL). Versions and cached pages are shared by every
+          API replica. Pass client= (e.g. fakeredis.aioredis.FakeRedis())
+          to run it against a local stand-in.
+
+Each backend carries a small circuit breaker (available / mark_down /
+mark_up): after a failed command callers skip it for
+CACHE_BACKEND_RETRY_SECONDS and use their local fallback instead.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+import os
+import random
+import time
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - only needed for CACHE_BACKEND=redis
+    redis_asyncio = None
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "kodekloud")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://redis:6379/0")
+# Per-command socket timeout: a slow cache must degrade to a miss, not a stall
+CACHE_REDIS_TIMEOUT_SECONDS = float(os.getenv("CACHE_REDIS_TIMEOUT_SECONDS", "0.25"))
+CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "10000"))
+# After a failed command the backend is skipped for this long, so an outage
+# costs one timeout per interval instead of one per request
+CACHE_BACKEND_RETRY_SECONDS = float(os.getenv("CACHE_BACKEND_RETRY_SECONDS", "5"))
+
+def _version_seed() -> int:
+    """
+    Starting value for a new version key.
+
+    Millisecond clock in the high bits plus 20 random bits, so a counter
+    that is recreated (process restart, flushed Redis) does not restart at
+    a number it has already handed out in an ETag or cache key.
+    """
+    return (int(time.time() * 1000) << 20) | random.getrandbits(20)
+
+class CacheBackend:
+    """Interface for cache storage. Values are bytes; ttl is in seconds."""
+
+    name = "base"
+    # True when other replicas see the same data (worth a second cache tier)
+    shared = False
+
+    def __init__(self, namespace: str = CACHE_NAMESPACE, retry_after: float = CACHE_BACKEND_RETRY_SECONDS):
+        self.namespace = namespace
+        self.retry_after = retry_after
+        # None while healthy, else when the next probe is allowed
+        self._down_until = None
+
+    def available(self) -> bool:
+        """
+        Circuit breaker check done by callers before using the backend.
+
+        False for `retry_after` seconds after mark_down(); then one caller
+        gets True to probe while the others keep using their fallback until
+        it reports mark_up() or mark_down().
+        """
+        if self._down_until is None:
+            return True
+        now = time.monotonic()
+        if now < self._down_until:
+            return False
+        self._down_until = now + self.retry_after
+        return True
+
+    def mark_down(self) -> None:
+        self._down_until = time.monotonic() + self.retry_after
+
+    def mark_up(self) -> None:
+        self._down_until = None
+
+    def key(self, *parts) -> str:
+        """Namespaced key: key("catalog", 7, "page") -> "kodekloud:catalog:7:page"."""
+        return ":".join([self.namespace, *map(str, parts)])
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def set_if_absent(self, key: str, value: bytes) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        raise NotImplementedError
+
+    async def get_version(self, key: str) -> int:
+        raw = await self.get(key)
+        if raw is None:
+            await self.set_if_absent(key, str(_version_seed()).encode())
+            raw = await self.get(key)
+        return int(raw)
+
+    async def bump_version(self, key: str, amount: int = 1) -> int:
+        # Seed first so a missing key is never INCRed up from 1
+        await self.get_version(key)
+        return await self.incr(key, amount)
+
+    async def close(self) -> None:
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Bounded LRU dict with lazy per-key expiry. Single event loop only.
+
+    Only correct for a single API process: each process keeps its own
+    catalog version, so with several replicas or uvicorn workers a write
+    bumps only the version of the process that handled it. Clients served
+    by the others keep getting 304 for their old ETag until that process
+    restarts. Use CACHE_BACKEND=redis (the docker-compose default) there.
+    """
+
+    name = "memory"
+
+    def __init__(self, namespace: str = CACHE_NAMESPACE, max_entries: int = CACHE_MEMORY_MAX_ENTRIES):
+        super().__init__(namespace)
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._store(key, None if ttl is None else time.monotonic() + ttl, value)
+
+    async def set_if_absent(self, key: str, value: bytes) -> bool:
+        if await self.get(key) is not None:
+            return False
+        self._store(key, None, value)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        value = int(await self.get(key) or 0) + amount
+        entry = self._data.get(key)
+        # Like INCR, keep whatever TTL the key already had
+        self._store(key, entry[0] if entry is not None else None, str(value).encode())
+        return value
+
+    def _store(self, key: str, expires_at: Optional[float], value: bytes) -> None:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+class RedisCacheBackend(CacheBackend):
+    """Backend for Redis (or anything speaking its protocol) via redis.asyncio."""
+
+    name = "redis"
+    shared = True
+
+    def __init__(
+        self,
+        url: str = CACHE_REDIS_URL,
+        namespace: str = CACHE_NAMESPACE,
+        client=None,
+        timeout: float = CACHE_REDIS_TIMEOUT_SECONDS,
+    ):
+        super().__init__(namespace)
+        if client is None:
+            if redis_asyncio is None:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+            # Connects lazily, on the first command
+            client = redis_asyncio.Redis.from_url(
+                url, socket_timeout=timeout, socket_connect_timeout=timeout
+            )
+        self._client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        await self._client.set(key, value, px=None if ttl is None else max(1, int(ttl * 1000)))
+
+    async def set_if_absent(self, key: str, value: bytes) -> bool:
+        return bool(await self._client.set(key, value, nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self._client.incr(key, amount)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+def create_cache_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    if kind == "redis":
+        return RedisCacheBackend()
+    if kind == "memory":
+        return MemoryCacheBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND {kind!r} (expected 'memory' or 'redis')")
+
+# Process-wide backend used by api/cache.py
+cache_backend = create_cache_backend()
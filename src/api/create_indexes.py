@@ -0,0 +1,61 @@
+"""
+One-off step that adds indexes introduced after a table was first created.
+
+create_all() only creates indexes together with a new table, so an existing
+orders table has to get ix_orders_status_id / ix_orders_product_id_id here.
+Each index is built with CREATE INDEX CONCURRENTLY IF NOT EXISTS on an
+autocommit connection, so checkout INSERTs keep running during the build
+and re-running the step (or racing another copy of it) is harmless. An
+INVALID index left behind by an interrupted concurrent build is dropped
+and rebuilt.
+
+Run it once per deploy, not from every API replica:
+
+  docker compose run --rm api python -m api.create_indexes
+"""
+
+from sqlalchemy import text
+
+from api.database import engine
+from api.logging_config import configure_logging, StructuredLogger
+from api import models
+
+logger = StructuredLogger(__name__)
+
+# Tables whose indexes may postdate the table itself
+TABLES = [models.Order.__table__]
+
+def _index_state(conn, name):
+    """None if the index does not exist, else whether it is valid."""
+    return conn.execute(
+        text(
+            "SELECT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ),
+        {"name": name},
+    ).scalar()
+
+def create_indexes():
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        preparer = conn.dialect.identifier_preparer
+        for table in TABLES:
+            for index in table.indexes:
+                state = _index_state(conn, index.name)
+                if state:
+                    logger.info("index_exists", index=index.name, table=table.name)
+                    continue
+                if state is False:
+                    logger.warning("index_invalid_rebuilding", index=index.name, table=table.name)
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {preparer.quote(index.name)}"))
+                columns = ", ".join(preparer.quote(column.name) for column in index.columns)
+                logger.info("index_build_started", index=index.name, table=table.name)
+                conn.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {preparer.quote(index.name)} "
+                    f"ON {preparer.format_table(table)} ({columns})"
+                ))
+                logger.info("index_build_complete", index=index.name, table=table.name)
+
+if __name__ == "__main__":
+    configure_logging()
+    create_indexes()
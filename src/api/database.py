@@ -1,7 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from api.metrics import (
+    database_connections_active,
+    database_connections_max,
+    database_pool_wait_seconds,
+    database_errors_total,
+)
 import os
+import time
 
 # Get database connection details from environment variables
 DB_USER = os.getenv("POSTGRES_USER", "admin")
@@ -10,15 +20,85 @@ DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "kodekloud_records")
 
+# Connection pool settings (per engine, per process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+class _PoolWaitMixin:
+    """Time every checkout attempt, including the time spent queued for a free slot."""
+
+    # `pool` label value; one class per engine, so it survives pool.recreate()
+    pool_name = None
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            database_errors_total.labels(
+                error_type="pool_timeout", operation="checkout", pool=self.pool_name
+            ).inc()
+            raise
+        finally:
+            database_pool_wait_seconds.labels(pool=self.pool_name).observe(time.perf_counter() - start_time)
+
+class InstrumentedQueuePool(_PoolWaitMixin, QueuePool):
+    pool_name = "sync"
+
+class InstrumentedAsyncQueuePool(_PoolWaitMixin, AsyncAdaptedQueuePool):
+    pool_name = "async"
 
-engine = create_engine(DATABASE_URL)
+def _track_pool(engine):
+    """Feed checkout/checkin events into this pool's saturation gauges."""
+    pool_name = engine.pool.pool_name
+    active = database_connections_active.labels(pool=pool_name)
+    # Each engine gets its own series: summing the pools would hide one of
+    # them being exhausted while the other sits idle
+    database_connections_max.labels(pool=pool_name).set(DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        active.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        active.dec()
+
+engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the request handlers: awaiting Postgres on the event loop
+# instead of blocking an AnyIO threadpool worker per request.
+# expire_on_commit=False keeps attributes loaded after commit, since lazy
+# refreshes are not possible on an AsyncSession.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+_track_pool(engine)
+_track_pool(async_engine.sync_engine)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
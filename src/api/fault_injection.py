@@ -0,0 +1,119 @@
+"""
+Configurable fault and latency injection for the demo endpoints.
+
+Delays are awaited with asyncio.sleep, so an injected slowdown only holds
+the request it is applied to and never a threadpool worker. Every rule
+can be tuned per route from the environment, and FAULT_INJECTION_ENABLED
+switches the whole module off.
+
+Environment (ROUTE is the rule key upper-cased, dots become underscores):
+    FAULT_INJECTION_ENABLED=true|false
+    FAULT_<ROUTE>_LATENCY_PROBABILITY=0.2
+    FAULT_<ROUTE>_LATENCY=fixed:0.3 | uniform:0.5:2.0 | exponential:0.25
+    FAULT_<ROUTE>_ERROR_RATE=0.1
+    FAULT_<ROUTE>_ERROR_STATUS=503
+"""
+
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from opentelemetry import trace
+from api.telemetry import get_tracer, start_span, SPAN_DEBUG
+from api.metrics import injected_faults_total
+import asyncio
+import logging
+import os
+import random
+
+logger = logging.getLogger(__name__)
+
+FAULT_INJECTION_ENABLED = os.getenv("FAULT_INJECTION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+@dataclass(frozen=True)
+class FaultRule:
+    latency_probability: float = 0.0
+    # (distribution, *params): ("fixed", s), ("uniform", lo, hi), ("exponential", mean)
+    latency: Tuple = ("fixed", 0.0)
+    error_rate: float = 0.0
+    error_status: int = 500
+
+# Defaults reproduce the behaviour the demo endpoints were built around
+DEFAULT_RULES = {
+    "checkout": FaultRule(latency_probability=0.2, latency=("uniform", 0.5, 2.0)),
+    "slow_operation": FaultRule(error_rate=0.3),
+    "slow_operation.database": FaultRule(latency_probability=1.0, latency=("fixed", 0.3)),
+    "slow_operation.processing": FaultRule(latency_probability=1.0, latency=("fixed", 0.5)),
+}
+
+def _parse_latency(spec: str) -> Tuple:
+    kind, *params = spec.split(":")
+    params = tuple(float(p) for p in params)
+    expected = {"fixed": 1, "uniform": 2, "exponential": 1}
+    if kind not in expected or len(params) != expected[kind]:
+        raise ValueError(f"Invalid latency spec {spec!r}")
+    return (kind, *params)
+
+def _rule_from_env(route: str, rule: FaultRule) -> FaultRule:
+    prefix = "FAULT_" + route.upper().replace(".", "_") + "_"
+    overrides = {}
+    try:
+        if (value := os.getenv(prefix + "LATENCY_PROBABILITY")) is not None:
+            overrides["latency_probability"] = float(value)
+        if (value := os.getenv(prefix + "LATENCY")) is not None:
+            overrides["latency"] = _parse_latency(value)
+        if (value := os.getenv(prefix + "ERROR_RATE")) is not None:
+            overrides["error_rate"] = float(value)
+        if (value := os.getenv(prefix + "ERROR_STATUS")) is not None:
+            overrides["error_status"] = int(value)
+    except ValueError as e:
+        logger.error(f"Ignoring invalid fault injection settings for {route}: {e}")
+        return rule
+    return replace(rule, **overrides)
+
+RULES = {route: _rule_from_env(route, rule) for route, rule in DEFAULT_RULES.items()}
+
+tracer = get_tracer(__name__)
+
+def sample_latency(route: str) -> float:
+    """Return the delay to inject for this request, or 0.0 for none."""
+    rule = RULES.get(route)
+    if not FAULT_INJECTION_ENABLED or rule is None or random.random() >= rule.latency_probability:
+        return 0.0
+    kind, *params = rule.latency
+    if kind == "uniform":
+        return random.uniform(*params)
+    if kind == "exponential":
+        return random.expovariate(1.0 / params[0])
+    return params[0]
+
+async def inject_latency(route: str, span_name: Optional[str] = None) -> float:
+    """
+    Await the sampled delay for `route` and return the seconds slept.
+
+    With `span_name` the delay gets its own span (at debug span verbosity);
+    otherwise it is recorded on the current span.
+    """
+    delay = sample_latency(route)
+    if delay <= 0:
+        return 0.0
+    injected_faults_total.labels(route=route, fault_type="latency").inc()
+    with (start_span(tracer, span_name, SPAN_DEBUG) if span_name else nullcontext()):
+        span = trace.get_current_span()
+        span.set_attribute("fault.route", route)
+        span.set_attribute("fault.delay_seconds", delay)
+        await asyncio.sleep(delay)
+    return delay
+
+def should_fail(route: str) -> bool:
+    """Decide whether to inject an error into this request."""
+    rule = RULES.get(route)
+    if not FAULT_INJECTION_ENABLED or rule is None or random.random() >= rule.error_rate:
+        return False
+    injected_faults_total.labels(route=route, fault_type="error").inc()
+    return True
+
+def maybe_raise(route: str) -> None:
+    """Raise an HTTPException with the rule's status if an error is injected."""
+    if should_fail(route):
+        raise HTTPException(status_code=RULES[route].error_status, detail="Injected fault")
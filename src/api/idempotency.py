@@ -0,0 +1,184 @@
+"""
+Idempotency-Key support for the order-creating endpoints.
+
+A client sends the same Idempotency-Key header on every retry of one
+logical request. The first request with a key claims it and runs; its
+2xx response is stored and replayed byte for byte to later requests with
+that key, without running the handler again. So a timed-out /checkout
+retried five times creates one order and publishes one task.
+
+  same key, still running         409
+  same key, different body        422
+  handler raised (4xx/5xx)        claim released; the retry runs normally
+
+Stores (IDEMPOTENCY_STORE):
+  memory    TTLCache per process, bounded by IDEMPOTENCY_MAX_KEYS (default).
+            Retries that land on another replica are not deduplicated.
+  database  idempotency_keys table, shared by all replicas.
+
+Keys are kept for IDEMPOTENCY_TTL_SECONDS. A claim whose request died
+mid-flight is taken over after IDEMPOTENCY_LOCK_TIMEOUT_SECONDS.
+"""
+
+from typing import Awaitable, Callable, NamedTuple, Optional
+import hashlib
+import os
+import time
+
+from fastapi import HTTPException, Response
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from api.cache import TTLCache
+from api.database import AsyncSessionLocal
+from api.metrics import idempotency_requests_total
+from api.models import IdempotencyKey
+from api.responses import dumps
+
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory").lower()
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "30"))
+# How often (at most) the database store deletes expired rows
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "60"))
+
+class IdempotencyRecord(NamedTuple):
+    fingerprint: str
+    # None while the first request is still running
+    status_code: Optional[int]
+    body: Optional[bytes]
+    locked_until: float
+
+class MemoryIdempotencyStore:
+    """Per-process store on a TTLCache: O(1) lookups, LRU-bounded."""
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self._records = TTLCache("idempotency", max_keys, ttl)
+
+    async def claim(self, scope: str, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        """Claim `key` and return None, or return the record already holding it."""
+        # No await between the lookup and the claim, so this is atomic on the event loop
+        existing = self._records.get((scope, key))
+        if existing is not None and (existing.status_code is not None or existing.locked_until > time.time()):
+            return existing
+        self._records.set(
+            (scope, key),
+            IdempotencyRecord(fingerprint, None, None, time.time() + IDEMPOTENCY_LOCK_TIMEOUT_SECONDS),
+        )
+        return None
+
+    async def complete(self, scope: str, key: str, fingerprint: str, status_code: int, body: bytes) -> None:
+        self._records.set((scope, key), IdempotencyRecord(fingerprint, status_code, body, 0.0))
+
+    async def release(self, scope: str, key: str) -> None:
+        self._records.invalidate((scope, key))
+
+class DatabaseIdempotencyStore:
+    """Store on the idempotency_keys table; each call uses its own short transaction."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.ttl = ttl
+        self._last_purge = 0.0
+
+    async def claim(self, scope: str, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        now = time.time()
+        if now - self._last_purge > IDEMPOTENCY_PURGE_INTERVAL_SECONDS:
+            await self._purge_expired(now)
+        async with AsyncSessionLocal() as db:
+            row = await db.get(IdempotencyKey, (scope, key))
+            if row is not None:
+                if row.expires_at > now and (row.status_code is not None or row.locked_until > now):
+                    return _record(row)
+                # Expired, or claimed by a request that never finished
+                await db.delete(row)
+                await db.flush()
+            db.add(IdempotencyKey(
+                scope=scope,
+                key=key,
+                fingerprint=fingerprint,
+                expires_at=now + self.ttl,
+                locked_until=now + IDEMPOTENCY_LOCK_TIMEOUT_SECONDS,
+            ))
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another replica claimed it between our read and insert
+                await db.rollback()
+                row = await db.get(IdempotencyKey, (scope, key), populate_existing=True)
+                if row is None:
+                    raise
+                return _record(row)
+        return None
+
+    async def _purge_expired(self, now: float) -> None:
+        # Own transaction: the claim below may return or roll back without
+        # committing, and the purge must not be discarded with it
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now))
+            await db.commit()
+        self._last_purge = now
+
+    async def complete(self, scope: str, key: str, fingerprint: str, status_code: int, body: bytes) -> None:
+        async with AsyncSessionLocal() as db:
+            row = await db.get(IdempotencyKey, (scope, key))
+            if row is not None:
+                row.status_code = status_code
+                row.response_body = body
+                await db.commit()
+
+    async def release(self, scope: str, key: str) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            )
+            await db.commit()
+
+def _record(row: IdempotencyKey) -> IdempotencyRecord:
+    return IdempotencyRecord(row.fingerprint, row.status_code, row.response_body, row.locked_until or 0.0)
+
+def create_idempotency_store(kind: str = IDEMPOTENCY_STORE):
+    if kind == "database":
+        return DatabaseIdempotencyStore()
+    if kind == "memory":
+        return MemoryIdempotencyStore()
+    raise ValueError(f"Unknown IDEMPOTENCY_STORE {kind!r} (expected 'memory' or 'database')")
+
+idempotency_store = create_idempotency_store()
+
+async def run_idempotent(scope: str, key: str, payload: dict, call: Callable[[], Awaitable[dict]]) -> Response:
+    """
+    Run `call` at most once per (scope, key) and return its JSON response.
+
+    `payload` is the validated request body; it is fingerprinted so that a
+    key reused for a different request is rejected instead of replayed.
+    """
+    fingerprint = hashlib.sha256(dumps(payload)).hexdigest()
+    existing = await idempotency_store.claim(scope, key, fingerprint)
+    if existing is not None:
+        if existing.fingerprint != fingerprint:
+            idempotency_requests_total.labels(route=scope, result="mismatch").inc()
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used with a different request body"
+            )
+        if existing.status_code is None:
+            idempotency_requests_total.labels(route=scope, result="in_progress").inc()
+            raise HTTPException(
+                status_code=409, detail="A request with this Idempotency-Key is still being processed"
+            )
+        idempotency_requests_total.labels(route=scope, result="replayed").inc()
+        return Response(
+            existing.body,
+            status_code=existing.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    idempotency_requests_total.labels(route=scope, result="new").inc()
+    try:
+        result = await call()
+    except BaseException:
+        await idempotency_store.release(scope, key)
+        raise
+    body = dumps(result)
+    await idempotency_store.complete(scope, key, fingerprint, 200, body)
+    return Response(body, media_type="application/json")
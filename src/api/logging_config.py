@@ -0,0 +1,156 @@
+"""
+JSON logging setup for the API.
+
+Two modes, selected with LOG_HANDLER_MODE:
+
+  queue (default)  log calls only enqueue the record on a bounded queue; a
+                   QueueListener thread formats and writes it. When the
+                   queue is full the record is dropped and counted in
+                   kodekloud_logs_dropped_total, so a slow sink (e.g. a
+                   backed-up fluentd driver) never blocks a request.
+  sync             format and write on the calling thread (previous behaviour).
+
+Records are encoded with orjson when it is installed, falling back to the
+standard json module.
+
+The root level comes from LOG_LEVEL (DEBUG, INFO, WARNING, ...; default
+INFO). Named loggers inherit it rather than setting their own, except
+api.requests (the middleware's request_processed lines), which
+REQUEST_LOG_LEVEL can set separately so sampled request logs survive a
+quieter LOG_LEVEL.
+
+StructuredLogger is the dict-based logger shared by all API modules.
+"""
+
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from opentelemetry import trace
+from api.metrics import logs_dropped_total
+import json
+import logging
+import os
+import queue
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# docker-compose passes an empty LOG_LEVEL when it is unset
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").upper()
+REQUEST_LOG_LEVEL = (os.getenv("REQUEST_LOG_LEVEL") or "").upper()
+REQUEST_LOGGER_NAME = "api.requests"
+LOG_HANDLER_MODE = os.getenv("LOG_HANDLER_MODE", "queue").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+if orjson is not None:
+    def _dumps(data):
+        return orjson.dumps(data, default=str).decode()
+else:
+    def _dumps(data):
+        return json.dumps(data, default=str)
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        if isinstance(record.msg, dict):
+            return _dumps(record.msg)
+        return _dumps({"message": record.getMessage(), "level": record.levelname})
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full."""
+
+    def prepare(self, record):
+        # The stock prepare() formats the record on the calling thread; leave
+        # that to the listener so the request path only pays for the enqueue
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            logs_dropped_total.inc()
+
+_listener = None
+
+def configure_logging(level=LOG_LEVEL):
+    """Install the JSON handler on the root logger according to LOG_HANDLER_MODE."""
+    global _listener
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    # Unset: api.requests inherits the root level
+    logging.getLogger(REQUEST_LOGGER_NAME).setLevel(REQUEST_LOG_LEVEL or logging.NOTSET)
+    # Remove existing handlers
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(JsonFormatter())
+
+    if LOG_HANDLER_MODE == "sync":
+        root_logger.addHandler(console_handler)
+        return
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root_logger.addHandler(DroppingQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+# (span context, trace_id hex, span_id hex) for the span last logged from in
+# this context, so the ids are hex-formatted once per span, not per log call
+_trace_ids = ContextVar("structured_logger_trace_ids", default=None)
+
+def current_trace_ids():
+    """Return (trace_id, span_id) of the current span as hex strings, or (None, None)."""
+    span_context = trace.get_current_span().get_span_context()
+    cached = _trace_ids.get()
+    if cached is not None and cached[0] is span_context:
+        return cached[1], cached[2]
+    if span_context.is_valid:
+        ids = (format(span_context.trace_id, "032x"), format(span_context.span_id, "016x"))
+    else:
+        ids = (None, None)
+    _trace_ids.set((span_context, *ids))
+    return ids
+
+class StructuredLogger:
+    """
+    Logs dicts (rendered by JsonFormatter) with the current trace context.
+
+    The level is checked before anything is built, so disabled calls cost a
+    single isEnabledFor() lookup.
+    """
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level, level_name, msg, kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        trace_id, span_id = current_trace_ids()
+        log_data = {
+            "message": msg,
+            "level": level_name,
+            "trace_id": trace_id,
+            "span_id": span_id,
+            **kwargs
+        }
+        self.logger.log(level, log_data)
+
+    def debug(self, msg, **kwargs):
+        self._log(logging.DEBUG, "DEBUG", msg, kwargs)
+
+    def info(self, msg, **kwargs):
+        self._log(logging.INFO, "INFO", msg, kwargs)
+
+    def warning(self, msg, **kwargs):
+        self._log(logging.WARNING, "WARNING", msg, kwargs)
+
+    def error(self, msg, **kwargs):
+        self._log(logging.ERROR, "ERROR", msg, kwargs)
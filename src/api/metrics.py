@@ -16,7 +16,9 @@ Best Practices Applied:
 """
 
 from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry
+from functools import lru_cache
 from typing import Optional
+import re
 
 # Create a custom registry to avoid conflicts with default metrics
 # This allows us to control exactly which metrics are exposed
@@ -98,11 +100,20 @@ application_errors_total = Counter(
     registry=METRICS_REGISTRY
 )
 
+# Faults deliberately injected by api/fault_injection.py (so they can be
+# told apart from real errors and latency on dashboards)
+injected_faults_total = Counter(
+    name='kodekloud_injected_faults_total',
+    documentation='Total number of injected faults',
+    labelnames=['route', 'fault_type'],  # fault_type: latency, error
+    registry=METRICS_REGISTRY
+)
+
 # Database errors
 database_errors_total = Counter(
     name='kodekloud_database_errors_total',
     documentation='Total number of database errors',
-    labelnames=['error_type', 'operation'],  # error_type: connection, timeout, constraint
+    labelnames=['error_type', 'operation', 'pool'],  # error_type: connection, timeout, constraint, pool_timeout
     registry=METRICS_REGISTRY
 )
 
@@ -121,12 +132,77 @@ active_connections = Gauge(
 database_connections_active = Gauge(
     name='kodekloud_database_connections_active',
     documentation='Number of active database connections',
+    labelnames=['pool'],  # pool: async (request handlers), sync (startup/scripts)
     registry=METRICS_REGISTRY
 )
 
 database_connections_max = Gauge(
     name='kodekloud_database_connections_max',
     documentation='Maximum number of database connections in pool',
+    labelnames=['pool'],
+    registry=METRICS_REGISTRY
+)
+
+# Time spent waiting for a connection from the pool. Growth in the upper
+# buckets is the early warning for pool exhaustion (before pool timeouts).
+database_pool_wait_seconds = Histogram(
+    name='kodekloud_database_pool_wait_seconds',
+    documentation='Time spent waiting to check out a database connection from the pool',
+    labelnames=['pool'],
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0],
+    registry=METRICS_REGISTRY
+)
+
+# In-process cache effectiveness (see api/cache.py)
+cache_requests_total = Counter(
+    name='kodekloud_cache_requests_total',
+    documentation='Total number of cache lookups',
+    labelnames=['cache', 'result'],  # result: hit, miss
+    registry=METRICS_REGISTRY
+)
+
+cache_evictions_total = Counter(
+    name='kodekloud_cache_evictions_total',
+    documentation='Total number of cache entries evicted',
+    labelnames=['cache', 'reason'],  # reason: capacity, expired, invalidated
+    registry=METRICS_REGISTRY
+)
+
+cache_entries = Gauge(
+    name='kodekloud_cache_entries_current',
+    documentation='Current number of entries held in the cache',
+    labelnames=['cache'],
+    registry=METRICS_REGISTRY
+)
+
+# Idempotency-Key outcomes (see api/idempotency.py)
+idempotency_requests_total = Counter(
+    name='kodekloud_idempotency_requests_total',
+    documentation='Total number of requests carrying an Idempotency-Key',
+    labelnames=['route', 'result'],  # result: new, replayed, in_progress, mismatch
+    registry=METRICS_REGISTRY
+)
+
+# Failed calls to the shared cache backend (see api/cache_backend.py)
+cache_backend_errors_total = Counter(
+    name='kodekloud_cache_backend_errors_total',
+    documentation='Total number of failed cache backend operations',
+    labelnames=['backend', 'operation'],
+    registry=METRICS_REGISTRY
+)
+
+# Tail sampling decisions for completed traces (see api/sampling.py)
+trace_tail_sampling_decisions_total = Counter(
+    name='kodekloud_trace_tail_sampling_decisions_total',
+    documentation='Tail sampling decisions for completed traces',
+    labelnames=['decision'],  # kept_error, kept_slow, kept_sampled, dropped, evicted
+    registry=METRICS_REGISTRY
+)
+
+# Log records dropped because the async logging queue was full
+logs_dropped_total = Counter(
+    name='kodekloud_logs_dropped_total',
+    documentation='Total number of log records dropped due to a full logging queue',
     registry=METRICS_REGISTRY
 )
 
@@ -169,6 +245,44 @@ customers_active_total = Gauge(
 # HELPER FUNCTIONS FOR COMMON METRIC PATTERNS
 # =============================================================================
 
+# Label used for requests that did not match any route (404s, scanners, ...)
+UNMATCHED_ROUTE = "unmatched"
+
+# Memo of (root_path, route id) -> route label. Bounded by the number of
+# registered routes in practice; the cap is only a safety net.
+_ROUTE_LABEL_CACHE_MAX = 1024
+_route_label_cache = {}
+
+def route_template(scope: dict) -> str:
+    """
+    Resolve the metric route label from the matched Starlette route.
+
+    The router stores the matched route in scope["route"] once routing has
+    run, so its path template (e.g. /orders/{order_id}/process) is used
+    as-is. Anything that did not match a route is folded into one
+    UNMATCHED_ROUTE bucket, so label cardinality is bounded by the number
+    of routes the app declares.
+    """
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    # Route objects are unhashable but live as long as the app, so key on id()
+    root_path = scope.get("root_path", "")
+    key = (root_path, id(route))
+    label = _route_label_cache.get(key)
+    if label is None:
+        path = getattr(route, "path", None)
+        label = root_path + path if path is not None else UNMATCHED_ROUTE
+        if len(_route_label_cache) >= _ROUTE_LABEL_CACHE_MAX:
+            _route_label_cache.clear()
+        _route_label_cache[key] = label
+    return label
+
+_NUMERIC_ID = re.compile(r'/\d+')
+_UUID = re.compile(r'/[a-f0-9\-]{36}')
+_HASH = re.compile(r'/[a-f0-9]{32}')
+
+@lru_cache(maxsize=1024)
 def normalize_route(path: str) -> str:
     """
     Normalize URL paths to avoid high cardinality in metrics.
@@ -179,17 +293,17 @@ def normalize_route(path: str) -> str:
     - /api/v1/orders/789 -> /api/v1/orders/{id}
     
     This prevents creating separate metric series for each unique ID.
+    Prefer route_template() when the ASGI scope is available: it uses the
+    declared route instead of guessing from the raw path.
     """
-    import re
-    
     # Replace numeric IDs with {id}
-    path = re.sub(r'/\d+', '/{id}', path)
+    path = _NUMERIC_ID.sub('/{id}', path)
     
     # Replace UUIDs with {uuid}
-    path = re.sub(r'/[a-f0-9\-]{36}', '/{uuid}', path)
+    path = _UUID.sub('/{uuid}', path)
     
     # Replace other potential high-cardinality values
-    path = re.sub(r'/[a-f0-9]{32}', '/{hash}', path)
+    path = _HASH.sub('/{hash}', path)
     
     return path
 
@@ -212,13 +326,13 @@ EXAMPLE USAGE IN MIDDLEWARE:
 async def metrics_middleware(request: Request, call_next):
     start_time = time.time()
     
-    # Get normalized route to avoid high cardinality
-    route = normalize_route(request.url.path)
     method = request.method
     
     try:
         response = await call_next(request)
         status_code = response.status_code
+        # Route template from the matched route, known once routing has run
+        route = route_template(request.scope)
         
         # Record successful request
         http_requests_total.labels(
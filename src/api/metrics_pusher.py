@@ -0,0 +1,101 @@
+"""
+Background Pushgateway exporter for the Celery worker.
+
+Tasks only mark the metrics as dirty; a daemon thread pushes the registry
+at most once per interval, so a burst of task completions turns into a
+single HTTP push and task latency never includes the export. Like the
+database pool, the thread is per process and started lazily after fork,
+and each process pushes under its own grouping key (instance + pid).
+"""
+
+from prometheus_client import REGISTRY, Counter, push_to_gateway
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between pushes; updates inside the window are coalesced
+PUSHGATEWAY_PUSH_INTERVAL = float(os.getenv("PUSHGATEWAY_PUSH_INTERVAL", "5"))
+PUSHGATEWAY_MAX_RETRIES = int(os.getenv("PUSHGATEWAY_MAX_RETRIES", "3"))
+PUSHGATEWAY_TIMEOUT = float(os.getenv("PUSHGATEWAY_TIMEOUT", "2"))
+
+METRICS_PUSHES = Counter(
+    'celery_metrics_pushes_total',
+    'Number of Pushgateway pushes attempted by the worker',
+    ['status']
+)
+
+class MetricsPusher:
+    """Coalescing, retrying Pushgateway pusher running on a daemon thread."""
+
+    def __init__(self, gateway, job, grouping_key=None, registry=REGISTRY,
+                 interval=PUSHGATEWAY_PUSH_INTERVAL, max_retries=PUSHGATEWAY_MAX_RETRIES,
+                 timeout=PUSHGATEWAY_TIMEOUT):
+        self.gateway = gateway
+        self.job = job
+        self.grouping_key = grouping_key or {}
+        self.registry = registry
+        self.interval = interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-pusher", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self):
+        """Schedule a push; returns immediately."""
+        with self._lock:
+            self._dirty = True
+        self._wake.set()
+
+    def _take_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, False
+        return dirty
+
+    def _push(self):
+        for attempt in range(self.max_retries + 1):
+            try:
+                push_to_gateway(
+                    self.gateway,
+                    job=self.job,
+                    registry=self.registry,
+                    grouping_key=self.grouping_key,
+                    timeout=self.timeout
+                )
+                METRICS_PUSHES.labels(status='success').inc()
+                logger.debug("Metrics pushed to Pushgateway")
+                return
+            except Exception as e:
+                METRICS_PUSHES.labels(status='failed').inc()
+                if attempt == self.max_retries:
+                    # Counters are cumulative, so the next push catches up
+                    logger.warning(f"Failed to push metrics after {attempt + 1} attempts: {e}")
+                    return
+                # Back off, but give up early if we are shutting down
+                if self._stop.wait(min(0.5 * 2 ** attempt, self.interval)):
+                    return
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if self._take_dirty():
+                self._push()
+            # Let further updates accumulate into the next push
+            self._stop.wait(self.interval)
+        if self._take_dirty():
+            self._push()
+
+    def stop(self, timeout=5.0):
+        """Stop the thread, flushing any pending update first."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
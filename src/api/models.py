@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from api.database import Base
 
@@ -15,3 +15,24 @@ class Order(Base):
     quantity = Column(Integer)
     status = Column(String, default="pending") 
     product = relationship("Product")
+
+    # Composite indexes backing the GET /orders filters: each one matches an
+    # equality filter followed by the keyset on id, so "latest N pending
+    # orders" is an index range scan instead of a sort over the whole table.
+    __table_args__ = (
+        Index("ix_orders_status_id", "status", "id"),
+        Index("ix_orders_product_id_id", "product_id", "id"),
+    )
+
+class IdempotencyKey(Base):
+    """Stored responses for Idempotency-Key requests (IDEMPOTENCY_STORE=database)."""
+    __tablename__ = "idempotency_keys"
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    # NULL until the first request finishes
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    # Unix timestamps
+    expires_at = Column(Float, nullable=False, index=True)
+    locked_until = Column(Float, nullable=True)
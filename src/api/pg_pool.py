@@ -0,0 +1,142 @@
+"""
+Per-process PostgreSQL connection pool for the Celery worker.
+
+Celery's prefork pool forks child processes after the worker module is
+imported, and a psycopg2 connection must never be shared across a fork.
+The pool is therefore created lazily in the process that uses it (and
+eagerly from the worker_process_init signal), keyed on the current pid.
+"""
+
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram
+from psycopg2 import pool as pg_pool
+from psycopg2 import extensions
+import psycopg2
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing and health check settings
+WORKER_DB_POOL_MIN = int(os.getenv("WORKER_DB_POOL_MIN", "1"))
+WORKER_DB_POOL_MAX = int(os.getenv("WORKER_DB_POOL_MAX", "4"))
+WORKER_DB_POOL_TIMEOUT = float(os.getenv("WORKER_DB_POOL_TIMEOUT", "10"))
+# Connections idle for longer than this are pinged before being handed out
+WORKER_DB_POOL_PING_AFTER = float(os.getenv("WORKER_DB_POOL_PING_AFTER", "30"))
+
+# Prometheus metrics (default registry, pushed with the other worker metrics)
+DB_POOL_IN_USE = Gauge(
+    'celery_db_pool_connections_in_use',
+    'Number of worker database connections currently checked out'
+)
+
+DB_POOL_MAX = Gauge(
+    'celery_db_pool_connections_max',
+    'Maximum number of worker database connections per process'
+)
+
+DB_POOL_CHECKOUT_DURATION = Histogram(
+    'celery_db_pool_checkout_seconds',
+    'Time spent acquiring a worker database connection from the pool',
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0]
+)
+
+DB_POOL_DISCARDED = Counter(
+    'celery_db_pool_connections_discarded_total',
+    'Number of worker database connections discarded as unhealthy',
+    ['reason']
+)
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection becomes free within WORKER_DB_POOL_TIMEOUT."""
+
+class WorkerConnectionPool:
+    """
+    Bounded psycopg2 pool with blocking checkout and health checks.
+
+    psycopg2's ThreadedConnectionPool raises immediately when exhausted, so
+    a semaphore bounds concurrent checkouts and lets callers wait up to a
+    timeout instead. Connections that are closed, in an unknown transaction
+    state or fail a ping after sitting idle are discarded and replaced.
+    """
+
+    def __init__(self, db_config, minconn=WORKER_DB_POOL_MIN, maxconn=WORKER_DB_POOL_MAX,
+                 timeout=WORKER_DB_POOL_TIMEOUT, ping_after=WORKER_DB_POOL_PING_AFTER):
+        self.pid = os.getpid()
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **db_config)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        DB_POOL_MAX.set(maxconn)
+        logger.info(f"Database pool created in process {self.pid} (min={minconn}, max={maxconn})")
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            DB_POOL_DISCARDED.labels(reason='closed').inc()
+            return False
+        if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            DB_POOL_DISCARDED.labels(reason='bad_state').inc()
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used > self.ping_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                DB_POOL_DISCARDED.labels(reason='ping_failed').inc()
+                return False
+        return True
+
+    def _checkout(self):
+        start_time = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            DB_POOL_CHECKOUT_DURATION.observe(time.perf_counter() - start_time)
+            raise PoolExhaustedError(f"No database connection available after {self.timeout}s")
+        try:
+            conn = self._pool.getconn()
+            while not self._is_healthy(conn):
+                self._discard(conn)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        DB_POOL_CHECKOUT_DURATION.observe(time.perf_counter() - start_time)
+        DB_POOL_IN_USE.inc()
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _checkin(self, conn, broken=False):
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+            else:
+                # putconn rolls back any transaction left open by the caller
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            DB_POOL_IN_USE.dec()
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; it is returned (or discarded if broken) on exit."""
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._checkin(conn, broken=broken)
+
+    def close(self):
+        self._pool.closeall()
+        self._last_used.clear()
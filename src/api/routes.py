@@ -1,57 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Path
-from sqlalchemy.orm import Session
-from api.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from api.database import get_async_db, AsyncSessionLocal
 from api.models import Product, Order
 from api.worker import process_order, send_order_confirmation
-from pydantic import BaseModel
-from api.telemetry import get_tracer
-import logging
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import List, Optional
+from celery import group
+from api.telemetry import get_tracer, start_span, span_enabled, SPAN_STANDARD, SPAN_DEBUG
+from api.cache import product_cache, catalog_version, catalog_page_cache, CachedProduct, CatalogPage
+from api.metrics import cache_requests_total
+from api import fault_injection
+from api.idempotency import run_idempotent
+from api.logging_config import StructuredLogger
+from api.responses import FastJSONResponse, dumps
 import json
 import time
-import random
+import os
 from opentelemetry import trace
 from opentelemetry.trace.status import Status, StatusCode
 
 router = APIRouter()
 
-# Create structured logger
-class StructuredLogger:
-    def __init__(self, name):
-        self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.INFO)
-    
-    def info(self, msg, **kwargs):
-        # Add trace context
-        span = trace.get_current_span()
-        span_context = span.get_span_context()
-        
-        # Format as JSON directly
-        log_data = {
-            "message": msg,
-            "level": "INFO",
-            "trace_id": format(span_context.trace_id, "032x") if span_context.is_valid else None,
-            "span_id": format(span_context.span_id, "016x") if span_context.is_valid else None,
-            **kwargs
-        }
-        # Use dict instead of string
-        self.logger.info(log_data)
-    
-    def error(self, msg, **kwargs):
-        # Add trace context
-        span = trace.get_current_span()
-        span_context = span.get_span_context()
-        
-        # Format as JSON directly
-        log_data = {
-            "message": msg,
-            "level": "ERROR",
-            "trace_id": format(span_context.trace_id, "032x") if span_context.is_valid else None,
-            "span_id": format(span_context.span_id, "016x") if span_context.is_valid else None,
-            **kwargs
-        }
-        # Use dict instead of string
-        self.logger.error(log_data)
-
 # Use structured logger
 logger = StructuredLogger(__name__)
 
@@ -68,47 +40,216 @@ class OrderCreate(BaseModel):
     product_id: int
     quantity: int
 
-@router.get("/products")
-def get_products(db: Session = Depends(get_db)):
-    with tracer.start_as_current_span("get_products") as span:
-        span.set_attribute("operation", "fetch_all_products")
+# Response Schemas
+class ProductOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    price: float
+
+class OrderOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    product_id: int
+    quantity: int
+    status: str
+
+# Largest number of line items accepted by POST /checkout/batch
+BATCH_CHECKOUT_MAX_ITEMS = int(os.getenv("BATCH_CHECKOUT_MAX_ITEMS", "1000"))
+
+# Batch Checkout Schema
+class BatchCheckout(BaseModel):
+    items: List[OrderCreate] = Field(..., min_length=1, max_length=BATCH_CHECKOUT_MAX_ITEMS)
+
+# Keyset pagination settings for list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Rows fetched per round trip from the server-side cursor in streaming mode
+STREAM_BATCH_SIZE = 500
+# Rows per multi-row INSERT in POST /products/bulk
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "1000"))
+
+# Conditional GET /products outcomes, on the same panel as the in-process caches
+_catalog_not_modified = cache_requests_total.labels(cache="catalog_etag", result="hit")
+_catalog_modified = cache_requests_total.labels(cache="catalog_etag", result="miss")
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check; RFC 9110 uses weak comparison for this header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _as_dicts(keys, rows):
+    """Column rows as plain dicts for FastJSONResponse (Row._asdict() is ~5x slower)."""
+    keys = tuple(keys)
+    return [dict(zip(keys, row)) for row in rows]
+
+async def _stream_products(after: int):
+    """
+    Stream the catalog as a JSON array straight from a server-side cursor.
+
+    Uses its own session because the generator outlives the request's
+    get_async_db dependency. yield_per enables stream_results, so only one
+    batch of rows is held in memory at a time regardless of catalog size.
+    """
+    async with AsyncSessionLocal() as db:
+        rows = await db.stream(
+            select(Product.id, Product.name, Product.price)
+            .where(Product.id > after)
+            .order_by(Product.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        keys = tuple(rows.keys())
+        yield b"["
+        first = True
+        async for row in rows:
+            item = dumps(dict(zip(keys, row)))
+            yield item if first else b"," + item
+            first = False
+        yield b"]"
+
+def _catalog_headers(etag: str) -> dict:
+    return {"Cache-Control": "no-cache", "ETag": etag}
+
+async def _fetch_products_page(after: int, limit: int, etag: str) -> CatalogPage:
+    """
+    Query and render one catalog page for catalog_page_cache.
+
+    Runs once per cache fill, possibly as a background revalidation after
+    the triggering request has finished, so it uses its own session (and
+    SingleFlightCache starts it in a new trace).
+    """
+    with start_span(tracer, "fetch_products_page") as span:
         start_time = time.time()
-        
         try:
-            products = db.query(Product).all()
-            duration = time.time() - start_time
-            span.set_attribute("products.count", len(products))
-            span.set_attribute("query.duration_ms", duration * 1000)
-            
-            logger.info(
-                "products_fetched",
-                count=len(products),
-                duration_ms=round(duration * 1000, 2),
-                operation="get_products"
-            )
-            return products
+            async with AsyncSessionLocal() as db:
+                # Plain column rows rather than ORM instances: nothing to hydrate,
+                # and each row maps straight onto ProductOut
+                result = await db.execute(
+                    select(Product.id, Product.name, Product.price)
+                    .where(Product.id > after)
+                    .order_by(Product.id)
+                    .limit(limit)
+                )
+                products = result.all()
         except Exception as e:
             span.set_status(Status(StatusCode.ERROR))
             span.record_exception(e)
             logger.error(
                 "products_fetch_error",
+                after=after,
+                limit=limit,
                 error=str(e),
                 error_type=type(e).__name__,
                 operation="get_products"
             )
             raise
+        duration = time.time() - start_time
+        span.set_attribute("products.count", len(products))
+        span.set_attribute("query.duration_ms", duration * 1000)
+        logger.info(
+            "products_fetched",
+            count=len(products),
+            after=after,
+            limit=limit,
+            duration_ms=round(duration * 1000, 2),
+            operation="get_products"
+        )
+        # A full page means there may be more rows; hand back the cursor
+        next_cursor = products[-1].id if len(products) == limit else None
+        return CatalogPage(dumps(_as_dicts(result.keys(), products)), len(products), next_cursor, etag)
+
+async def get_cached_product(db: AsyncSession, product_id: int) -> Optional[CachedProduct]:
+    """Product lookup for the order paths, served from product_cache when warm."""
+    product = product_cache.get(product_id)
+    trace.get_current_span().set_attribute("product.cache_hit", product is not None)
+    if product is None:
+        row = await db.get(Product, product_id)
+        if row is None:
+            return None
+        product = CachedProduct(row.id, row.name, row.price)
+        product_cache.set(product_id, product)
+    return product
+
+@router.get("/products", response_model=List[ProductOut], response_class=FastJSONResponse)
+async def get_products(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: int = Query(0, ge=0, description="Return products with id greater than this cursor"),
+    stream: bool = Query(False, description="Stream every product after the cursor"),
+):
+    with start_span(tracer, "get_products") as span:
+        span.set_attribute("operation", "fetch_products_page")
+        span.set_attribute("page.after", after)
+        span.set_attribute("page.limit", limit)
+        span.set_attribute("page.stream", stream)
+
+        # Read the version before querying: a write racing with this request
+        # leaves the ETag older than the body, so the next poll refetches.
+        version = await catalog_version.current()
+        etag = catalog_version.etag(version)
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            _catalog_not_modified.inc()
+            span.set_attribute("http.not_modified", True)
+            return Response(status_code=304, headers=_catalog_headers(etag))
+        _catalog_modified.inc()
+
+        try:
+            if stream:
+                logger.info(
+                    "products_stream_started",
+                    after=after,
+                    operation="get_products"
+                )
+                return StreamingResponse(
+                    _stream_products(after),
+                    media_type="application/json",
+                    headers=_catalog_headers(etag)
+                )
+
+            # One DB fetch per (page, catalog version) however many requests
+            # are waiting; see api/cache.py for the stale-serving rules
+            page, cache_result = await catalog_page_cache.get_or_fetch(
+                (after, limit), version, lambda: _fetch_products_page(after, limit, etag)
+            )
+            span.set_attribute("cache.result", cache_result)
+            span.set_attribute("products.count", page.count)
+            if cache_result == "stale_if_error":
+                logger.warning(
+                    "products_served_stale",
+                    after=after,
+                    limit=limit,
+                    operation="get_products"
+                )
+
+            # The page's own ETag: older than `etag` when served stale
+            response = Response(page.body, media_type="application/json", headers=_catalog_headers(page.etag))
+            if page.next_cursor is not None:
+                response.headers["X-Next-Cursor"] = str(page.next_cursor)
+            return response
+        except Exception as e:
+            # Already logged where the fetch failed
+            span.set_status(Status(StatusCode.ERROR))
+            span.record_exception(e)
+            raise
 
-@router.post("/products")
-def create_product(product: ProductCreate, db: Session = Depends(get_db)):
-    with tracer.start_as_current_span("create_product") as span:
+@router.post("/products", response_model=ProductOut)
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    with start_span(tracer, "create_product") as span:
         span.set_attribute("product.name", product.name)
         span.set_attribute("product.price", product.price)
         
         try:
             db_product = Product(name=product.name, price=product.price)
             db.add(db_product)
-            db.commit()
-            db.refresh(db_product)
+            await db.commit()
+            await db.refresh(db_product)
+            product_cache.invalidate(db_product.id)
+            await catalog_version.bump()
             
             span.set_attribute("product.id", db_product.id)
             logger.info(
@@ -131,16 +272,148 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
             )
             raise
 
+async def _iter_bulk_products(request: Request):
+    """
+    Yield validated ProductCreate items from a bulk upload.
+
+    NDJSON bodies (application/x-ndjson) are parsed line by line as they
+    arrive; anything else is treated as a single JSON array.
+    """
+    def parse(item, position):
+        try:
+            return ProductCreate.model_validate(item)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail={"item": position, "errors": e.errors(include_url=False)})
+
+    def decode(raw, position):
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON at item {position}: {e}")
+
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type:
+        buffer = b""
+        position = 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield parse(decode(line, position), position)
+                    position += 1
+        if buffer.strip():
+            yield parse(decode(buffer, position), position)
+    else:
+        items = decode(await request.body(), 0)
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of products")
+        for position, item in enumerate(items):
+            yield parse(item, position)
+
+@router.post("/products/bulk")
+async def create_products_bulk(request: Request, db: AsyncSession = Depends(get_async_db)):
+    with start_span(tracer, "create_products_bulk") as span:
+        span.set_attribute("bulk.chunk_size", BULK_INSERT_CHUNK_SIZE)
+        start_time = time.time()
+        ids = []
+        chunk_index = 0
+
+        async def flush(rows):
+            nonlocal chunk_index
+            with start_span(tracer, "bulk_insert_chunk", SPAN_STANDARD) as chunk_span:
+                chunk_start = time.time()
+                # insertmanyvalues renders multi-row INSERT ... RETURNING batches;
+                # sort_by_parameter_order keeps the ids aligned with the input
+                result = await db.execute(
+                    insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                    rows
+                )
+                ids.extend(result.scalars().all())
+                chunk_timing = {
+                    "chunk.index": chunk_index,
+                    "chunk.size": len(rows),
+                    "chunk.duration_ms": (time.time() - chunk_start) * 1000,
+                }
+                if span_enabled(SPAN_STANDARD):
+                    chunk_span.set_attributes(chunk_timing)
+                else:
+                    # chunk_span is the enclosing span here; one event per chunk
+                    # keeps every chunk's timing instead of only the last one
+                    chunk_span.add_event("bulk_insert_chunk", chunk_timing)
+            chunk_index += 1
+
+        try:
+            rows = []
+            async for product in _iter_bulk_products(request):
+                rows.append({"name": product.name, "price": product.price})
+                if len(rows) >= BULK_INSERT_CHUNK_SIZE:
+                    await flush(rows)
+                    rows = []
+            if rows:
+                await flush(rows)
+            # One transaction for the whole upload: it is applied entirely or not at all
+            await db.commit()
+
+            for product_id in ids:
+                product_cache.invalidate(product_id)
+            if ids:
+                await catalog_version.bump()
+
+            duration = time.time() - start_time
+            span.set_attribute("products.inserted", len(ids))
+            span.set_attribute("bulk.chunks", chunk_index)
+            logger.info(
+                "products_bulk_created",
+                count=len(ids),
+                chunks=chunk_index,
+                duration_ms=round(duration * 1000, 2),
+                operation="create_products_bulk"
+            )
+            return {"inserted": len(ids), "ids": ids}
+        except HTTPException as he:
+            await db.rollback()
+            span.set_status(Status(StatusCode.ERROR))
+            span.set_attribute("error.status_code", he.status_code)
+            raise
+        except Exception as e:
+            await db.rollback()
+            span.set_status(Status(StatusCode.ERROR))
+            span.record_exception(e)
+            logger.error(
+                "products_bulk_creation_error",
+                inserted_before_error=len(ids),
+                error=str(e),
+                error_type=type(e).__name__,
+                operation="create_products_bulk"
+            )
+            raise
+
+# Retries carrying the same Idempotency-Key replay the first response
+IdempotencyKeyHeader = Header(None, alias="Idempotency-Key", min_length=1, max_length=255)
+
 @router.post("/checkout")
-def checkout(order: OrderCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    with tracer.start_as_current_span("checkout_order") as span:
+async def checkout(
+    order: OrderCreate,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = IdempotencyKeyHeader,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if idempotency_key is None:
+        return await _checkout(order, background_tasks, db)
+    return await run_idempotent(
+        "checkout", idempotency_key, order.model_dump(), lambda: _checkout(order, background_tasks, db)
+    )
+
+async def _checkout(order: OrderCreate, background_tasks: BackgroundTasks, db: AsyncSession):
+    with start_span(tracer, "checkout_order") as span:
         span.set_attribute("order.product_id", order.product_id)
         span.set_attribute("order.quantity", order.quantity)
         
         try:
             # Verify product exists
-            with tracer.start_as_current_span("verify_product") as product_span:
-                product = db.query(Product).filter(Product.id == order.product_id).first()
+            with start_span(tracer, "verify_product", SPAN_DEBUG) as product_span:
+                product = await get_cached_product(db, order.product_id)
                 product_span.set_attribute("product.found", product is not None)
                 
                 if not product:
@@ -157,29 +430,28 @@ def checkout(order: OrderCreate, background_tasks: BackgroundTasks, db: Session
                 product_span.set_attribute("product.name", product.name)
                 product_span.set_attribute("product.price", product.price)
 
-            # Simulate occasional latency
-            if random.random() < 0.2:  # 20% chance of delay
-                with tracer.start_as_current_span("processing_delay"):
-                    delay = random.uniform(0.5, 2.0)
-                    time.sleep(delay)
-                    logger.info(
-                        "processing_delay",
-                        delay_seconds=round(delay, 2),
-                        operation="checkout"
-                    )
+            # Simulate occasional latency / failures (see api/fault_injection.py)
+            delay = await fault_injection.inject_latency("checkout", span_name="processing_delay")
+            if delay:
+                logger.info(
+                    "processing_delay",
+                    delay_seconds=round(delay, 2),
+                    operation="checkout"
+                )
+            fault_injection.maybe_raise("checkout")
 
             # Create order record in database
-            with tracer.start_as_current_span("create_order_record") as create_span:
+            with start_span(tracer, "create_order_record", SPAN_DEBUG) as create_span:
                 db_order = Order(product_id=order.product_id, quantity=order.quantity)
                 db.add(db_order)
-                db.commit()
-                db.refresh(db_order)
+                await db.commit()
+                await db.refresh(db_order)
                 create_span.set_attribute("order.id", db_order.id)
             
             # Send to Celery for background processing
-            with tracer.start_as_current_span("queue_background_processing") as queue_span:
-                order_data = {"product_id": order.product_id, "quantity": order.quantity}
-                task = process_order.delay(order_data)
+            with start_span(tracer, "queue_background_processing", SPAN_DEBUG) as queue_span:
+                order_data = {"order_id": db_order.id, "product_id": order.product_id, "quantity": order.quantity}
+                task = await run_in_threadpool(process_order.delay, order_data)
                 queue_span.set_attribute("task.id", task.id)
             
             # Queue confirmation email
@@ -221,18 +493,153 @@ def checkout(order: OrderCreate, background_tasks: BackgroundTasks, db: Session
             )
             raise
 
-@router.get("/orders")
-def get_orders(db: Session = Depends(get_db)):
-    with tracer.start_as_current_span("get_orders") as span:
+@router.post("/checkout/batch")
+async def checkout_batch(batch: BatchCheckout, db: AsyncSession = Depends(get_async_db)):
+    with start_span(tracer, "checkout_batch") as span:
+        span.set_attribute("batch.items", len(batch.items))
+        
+        try:
+            # Verify every product with one IN query (cache hits skip the query)
+            with start_span(tracer, "verify_products", SPAN_DEBUG) as product_span:
+                product_ids = {item.product_id for item in batch.items}
+                missing = {pid for pid in product_ids if product_cache.get(pid) is None}
+                if missing:
+                    result = await db.execute(
+                        select(Product.id, Product.name, Product.price).where(Product.id.in_(missing))
+                    )
+                    for row in result:
+                        product_cache.set(row.id, CachedProduct(row.id, row.name, row.price))
+                        missing.discard(row.id)
+                product_span.set_attribute("products.distinct", len(product_ids))
+                
+                if missing:
+                    error_msg = f"Products not found: {sorted(missing)}"
+                    product_span.set_status(Status(StatusCode.ERROR))
+                    product_span.set_attribute("error.message", error_msg)
+                    logger.error(
+                        "product_not_found",
+                        product_ids=sorted(missing),
+                        operation="checkout_batch"
+                    )
+                    raise HTTPException(status_code=404, detail=error_msg)
+
+            # Create all order records with one multi-row INSERT
+            with start_span(tracer, "create_order_records", SPAN_DEBUG) as create_span:
+                result = await db.execute(
+                    insert(Order).returning(Order.id, sort_by_parameter_order=True),
+                    [
+                        {"product_id": item.product_id, "quantity": item.quantity, "status": "pending"}
+                        for item in batch.items
+                    ]
+                )
+                order_ids = result.scalars().all()
+                await db.commit()
+                create_span.set_attribute("orders.count", len(order_ids))
+            
+            # Publish processing and confirmation tasks as one group
+            with start_span(tracer, "queue_background_processing", SPAN_DEBUG) as queue_span:
+                job = group(
+                    [
+                        process_order.s(
+                            {"order_id": order_id, "product_id": item.product_id, "quantity": item.quantity}
+                        )
+                        for order_id, item in zip(order_ids, batch.items)
+                    ] + [send_order_confirmation.s(order_id) for order_id in order_ids]
+                )
+                group_result = await run_in_threadpool(job.apply_async)
+                queue_span.set_attribute("group.id", group_result.id)
+                queue_span.set_attribute("group.size", len(job.tasks))
+
+            logger.info(
+                "batch_order_placed",
+                order_count=len(order_ids),
+                first_order_id=order_ids[0],
+                group_id=group_result.id,
+                operation="checkout_batch"
+            )
+            
+            span.set_attribute("orders.count", len(order_ids))
+            span.set_attribute("order.group_id", group_result.id)
+            
+            return {
+                "message": "Orders received, processing in the background",
+                "order_ids": order_ids,
+                "group_id": group_result.id
+            }
+        except HTTPException as he:
+            span.set_status(Status(StatusCode.ERROR))
+            span.set_attribute("error.status_code", he.status_code)
+            span.set_attribute("error.detail", he.detail)
+            raise
+        except Exception as e:
+            span.set_status(Status(StatusCode.ERROR))
+            span.record_exception(e)
+            logger.error(
+                "checkout_batch_error",
+                items=len(batch.items),
+                error=str(e),
+                error_type=type(e).__name__,
+                operation="checkout_batch"
+            )
+            raise
+
+@router.get("/orders", response_model=List[OrderOut], response_class=FastJSONResponse)
+async def get_orders(
+    status: Optional[str] = Query(None, description="Only orders with this status"),
+    product_id: Optional[int] = Query(None, description="Only orders for this product"),
+    min_id: Optional[int] = Query(None, ge=0, description="Lowest order id to include"),
+    max_id: Optional[int] = Query(None, ge=0, description="Highest order id to include"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, ge=0, description="Keyset cursor from X-Next-Cursor"),
+    newest_first: bool = Query(False, description="Page from the newest order backwards"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    with start_span(tracer, "get_orders") as span:
+        span.set_attribute("page.limit", limit)
+        span.set_attribute("page.newest_first", newest_first)
         try:
-            orders = db.query(Order).all()
+            query = select(Order.id, Order.product_id, Order.quantity, Order.status)
+            if status is not None:
+                query = query.where(Order.status == status)
+                span.set_attribute("filter.status", status)
+            if product_id is not None:
+                query = query.where(Order.product_id == product_id)
+                span.set_attribute("filter.product_id", product_id)
+            if min_id is not None:
+                query = query.where(Order.id >= min_id)
+            if max_id is not None:
+                query = query.where(Order.id <= max_id)
+
+            # Keyset pagination: the cursor is the last id of the previous page
+            # in iteration order, so it is served by ix_orders_status_id /
+            # ix_orders_product_id_id (or the primary key) without an OFFSET.
+            if newest_first:
+                if after is not None:
+                    query = query.where(Order.id < after)
+                query = query.order_by(Order.id.desc())
+            else:
+                if after is not None:
+                    query = query.where(Order.id > after)
+                query = query.order_by(Order.id)
+
+            result = await db.execute(query.limit(limit))
+            orders = result.all()
             span.set_attribute("orders.count", len(orders))
+
+            response = FastJSONResponse(_as_dicts(result.keys(), orders))
+            if len(orders) == limit:
+                response.headers["X-Next-Cursor"] = str(orders[-1].id)
+
             logger.info(
                 "orders_fetched",
                 count=len(orders),
+                status=status,
+                product_id=product_id,
+                after=after,
+                limit=limit,
                 operation="get_orders"
             )
-            return orders
+            return response
         except Exception as e:
             span.set_status(Status(StatusCode.ERROR))
             span.record_exception(e)
@@ -245,15 +652,26 @@ def get_orders(db: Session = Depends(get_db)):
             raise
 
 @router.post("/orders")
-def create_order(order: OrderCreate, db: Session = Depends(get_db)):
-    with tracer.start_as_current_span("create_order") as span:
+async def create_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = IdempotencyKeyHeader,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if idempotency_key is None:
+        return await _create_order(order, db)
+    return await run_idempotent(
+        "create_order", idempotency_key, order.model_dump(), lambda: _create_order(order, db)
+    )
+
+async def _create_order(order: OrderCreate, db: AsyncSession):
+    with start_span(tracer, "create_order") as span:
         span.set_attribute("order.product_id", order.product_id)
         span.set_attribute("order.quantity", order.quantity)
         
         try:
             # Verify product exists
-            with tracer.start_as_current_span("verify_product") as product_span:
-                product = db.query(Product).filter(Product.id == order.product_id).first()
+            with start_span(tracer, "verify_product", SPAN_DEBUG) as product_span:
+                product = await get_cached_product(db, order.product_id)
                 product_span.set_attribute("product.found", product is not None)
                 
                 if not product:
@@ -270,8 +688,8 @@ def create_order(order: OrderCreate, db: Session = Depends(get_db)):
             # Create order record in database
             db_order = Order(product_id=order.product_id, quantity=order.quantity, status="pending")
             db.add(db_order)
-            db.commit()
-            db.refresh(db_order)
+            await db.commit()
+            await db.refresh(db_order)
             
             span.set_attribute("order.id", db_order.id)
             logger.info(
@@ -308,17 +726,17 @@ def create_order(order: OrderCreate, db: Session = Depends(get_db)):
 
 # New endpoint to manually process an order
 @router.post("/orders/{order_id}/process")
-def process_specific_order(
+async def process_specific_order(
     order_id: int = Path(..., title="The ID of the order to process"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    with tracer.start_as_current_span("process_specific_order") as span:
+    with start_span(tracer, "process_specific_order") as span:
         span.set_attribute("order.id", order_id)
         
         try:
             # Check if order exists
-            with tracer.start_as_current_span("verify_order") as order_span:
-                order = db.query(Order).filter(Order.id == order_id).first()
+            with start_span(tracer, "verify_order", SPAN_DEBUG) as order_span:
+                order = await db.get(Order, order_id)
                 order_span.set_attribute("order.found", order is not None)
                 
                 if not order:
@@ -333,9 +751,9 @@ def process_specific_order(
                     raise HTTPException(status_code=404, detail=error_msg)
             
             # Send to Celery for processing
-            with tracer.start_as_current_span("queue_background_processing") as queue_span:
-                order_data = {"product_id": order.product_id, "quantity": order.quantity}
-                task = process_order.delay(order_data)
+            with start_span(tracer, "queue_background_processing", SPAN_DEBUG) as queue_span:
+                order_data = {"order_id": order.id, "product_id": order.product_id, "quantity": order.quantity}
+                task = await run_in_threadpool(process_order.delay, order_data)
                 queue_span.set_attribute("task.id", task.id)
             
             span.set_attribute("task.id", task.id)
@@ -371,7 +789,7 @@ def process_specific_order(
 
 # Add a new endpoint for demonstrating slow requests and tracing
 @router.get("/slow-operation")
-def slow_operation():
+async def slow_operation():
     with tracer.start_as_current_span("slow_operation") as span:
         span.set_attribute("operation.type", "demo_slow")
         
@@ -384,22 +802,22 @@ def slow_operation():
         # Perform a series of nested operations with delays
         with tracer.start_as_current_span("database_simulation") as db_span:
             db_span.set_attribute("database.operation", "query")
-            time.sleep(0.3)  # Simulate DB query
+            db_delay = await fault_injection.inject_latency("slow_operation.database")  # Simulate DB query
             
             # Add another level of nesting
             with tracer.start_as_current_span("data_processing") as proc_span:
                 proc_span.set_attribute("processing.type", "aggregation")
-                time.sleep(0.5)  # Simulate processing
+                processing_delay = await fault_injection.inject_latency("slow_operation.processing")  # Simulate processing
                 
                 # Log processing step
                 logger.info(
                     "data_processing_step",
-                    duration_ms=500,
+                    duration_ms=round(processing_delay * 1000),
                     operation="data_processing"
                 )
                 
         # Random chance of error for demonstration
-        if random.random() < 0.3:  # 30% chance of error
+        if fault_injection.should_fail("slow_operation"):
             with tracer.start_as_current_span("error_simulation") as error_span:
                 error_span.set_status(Status(StatusCode.ERROR))
                 error_span.set_attribute("error.type", "RandomFailure")
@@ -413,10 +831,11 @@ def slow_operation():
                 return {"status": "error", "message": "Random failure occurred"}
         
         # Log completion
+        duration_ms = round((db_delay + processing_delay) * 1000)
         logger.info(
             "slow_operation_completed",
-            duration_ms=800,
+            duration_ms=duration_ms,
             operation="slow_operation"
         )
         
-        return {"status": "success", "message": "Slow operation completed", "duration_ms": 800}
\ No newline at end of file
+        return {"status": "success", "message": "Slow operation completed", "duration_ms": duration_ms}
\ No newline at end of file
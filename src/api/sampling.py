@@ -0,0 +1,95 @@
+"""
+Tail sampling for the API and worker.
+
+The head sampler is the SDK's own, configured with the standard
+OTEL_TRACES_SAMPLER / OTEL_TRACES_SAMPLER_ARG variables (see telemetry.py).
+
+TailSamplingSpanProcessor makes the keep/drop decision once a trace's
+local root span has ended. Until then it buffers the trace's spans. A
+trace is always exported when any of its spans errored or ran longer
+than the latency threshold; other traces are exported with probability
+`ratio` (chosen from the trace id, so every service that sees the trace
+makes the same call). Exporter work then scales with the interesting
+traffic rather than all traffic.
+"""
+
+from collections import OrderedDict
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.trace import StatusCode
+from api.metrics import trace_tail_sampling_decisions_total
+import os
+import threading
+
+TRACE_TAIL_SAMPLING_ENABLED = os.getenv("TRACE_TAIL_SAMPLING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACE_TAIL_LATENCY_THRESHOLD_MS = float(os.getenv("TRACE_TAIL_LATENCY_THRESHOLD_MS", "1000"))
+TRACE_TAIL_SAMPLE_RATIO = float(os.getenv("TRACE_TAIL_SAMPLE_RATIO", "0.1"))
+TRACE_TAIL_MAX_TRACES = int(os.getenv("TRACE_TAIL_MAX_TRACES", "10000"))
+
+_TRACE_ID_MASK = (1 << 64) - 1
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Buffer spans per trace and forward whole traces worth keeping to `delegate`."""
+
+    def __init__(self, delegate, latency_threshold_ms=TRACE_TAIL_LATENCY_THRESHOLD_MS,
+                 ratio=TRACE_TAIL_SAMPLE_RATIO, max_traces=TRACE_TAIL_MAX_TRACES):
+        self.delegate = delegate
+        self.latency_threshold_ns = int(latency_threshold_ms * 1_000_000)
+        self.ratio_bound = round(ratio * (_TRACE_ID_MASK + 1))
+        self.max_traces = max_traces
+        # trace_id -> [spans, keep_reason or None]
+        self._pending = OrderedDict()
+        # trace_id -> kept?, for spans that end after their local root
+        self._decided = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context=None):
+        self.delegate.on_start(span, parent_context=parent_context)
+
+    def _keep_reason(self, span):
+        if span.status.status_code is StatusCode.ERROR:
+            return "kept_error"
+        if span.end_time - span.start_time >= self.latency_threshold_ns:
+            return "kept_slow"
+        return None
+
+    def _remember(self, trace_id, keep):
+        self._decided[trace_id] = keep
+        if len(self._decided) > self.max_traces:
+            self._decided.popitem(last=False)
+
+    def on_end(self, span):
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        reason = self._keep_reason(span)
+        with self._lock:
+            decided = self._decided.get(trace_id)
+            if decided is not None:
+                # Straggler after the decision: follow it
+                to_export = [span] if decided else []
+            else:
+                entry = self._pending.get(trace_id)
+                if entry is None:
+                    entry = self._pending[trace_id] = [[], None]
+                    if len(self._pending) > self.max_traces:
+                        # Drop the oldest undecided trace rather than grow without bound
+                        self._pending.popitem(last=False)
+                        trace_tail_sampling_decisions_total.labels(decision="evicted").inc()
+                entry[0].append(span)
+                if reason is not None and entry[1] is None:
+                    entry[1] = reason
+                if not is_local_root:
+                    return
+                spans, keep_reason = self._pending.pop(trace_id)
+                if keep_reason is None and (trace_id & _TRACE_ID_MASK) < self.ratio_bound:
+                    keep_reason = "kept_sampled"
+                self._remember(trace_id, keep_reason is not None)
+                trace_tail_sampling_decisions_total.labels(decision=keep_reason or "dropped").inc()
+                to_export = spans if keep_reason is not None else []
+        for finished in to_export:
+            self.delegate.on_end(finished)
+
+    def shutdown(self):
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis=30000):
+        return self.delegate.force_flush(timeout_millis)
@@ -8,13 +8,36 @@ from opentelemetry import propagate
 import logging
 import os
 import socket
-import time
 import sys
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from api.sampling import TailSamplingSpanProcessor, TRACE_TAIL_SAMPLING_ENABLED
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased
 logger = logging.getLogger(__name__)
 
 # Use an environment variable to determine the service name
 SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "kodekloud-record-store-service")
 
+# OTLP gRPC endpoint (Jaeger by default)
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://jaeger:4317")
+# Exporter connectivity check at startup: off, background (default) or blocking
+TELEMETRY_CONNECTIVITY_CHECK = os.getenv("TELEMETRY_CONNECTIVITY_CHECK", "background").lower()
+
+# Which manual spans to create on top of the auto-instrumentation spans
+# (FastAPI server span, SQLAlchemy and Celery spans), see start_span():
+#   minimal   no manual spans
+#   standard  one span per route handler / task (default)
+#   debug     also the per-step spans and the middleware request span
+SPAN_MINIMAL = "minimal"
+SPAN_STANDARD = "standard"
+SPAN_DEBUG = "debug"
+_SPAN_LEVELS = {SPAN_MINIMAL: 0, SPAN_STANDARD: 1, SPAN_DEBUG: 2}
+SPAN_VERBOSITY = os.getenv("SPAN_VERBOSITY", SPAN_STANDARD).lower()
+if SPAN_VERBOSITY not in _SPAN_LEVELS:
+    logger.error(f"Unknown SPAN_VERBOSITY {SPAN_VERBOSITY!r}, using {SPAN_STANDARD}")
+    SPAN_VERBOSITY = SPAN_STANDARD
+
 # Global flag to track if telemetry has been set up
 _telemetry_initialized = False
 
@@ -43,6 +66,7 @@ from api.metrics import (
     customers_active_total,
     # Helper functions
     normalize_route,
+    route_template,
     get_error_class
 )
 
@@ -69,16 +93,16 @@ def setup_telemetry(service_name=None):
         logger.info(f"⚠️ Telemetry already initialized, ignoring setup for {actual_service_name}")
         return False
     
-    # Test network connectivity to Jaeger
-    try:
-        logger.info(f"🌐 Testing network connectivity to Jaeger OTLP endpoint...")
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(1)
-        s.connect(("jaeger", 4317))  # OTLP gRPC port
-        s.close()
-        logger.info("✅ Network connection to Jaeger OTLP endpoint successful")
-    except Exception as e:
-        logger.error(f"❌ Failed to connect to Jaeger OTLP endpoint: {e}")
+    # Test network connectivity to the OTLP endpoint without holding up boot
+    if TELEMETRY_CONNECTIVITY_CHECK == "blocking":
+        check_exporter_connectivity(OTLP_ENDPOINT)
+    elif TELEMETRY_CONNECTIVITY_CHECK != "off":
+        threading.Thread(
+            target=check_exporter_connectivity,
+            args=(OTLP_ENDPOINT,),
+            name="otlp-connectivity-check",
+            daemon=True
+        ).start()
     
     try:
         logger.info(f"🔧 Creating TracerProvider for {actual_service_name}")
@@ -89,20 +113,35 @@ def setup_telemetry(service_name=None):
             "deployment.environment": "development"
         })
         
-        provider = TracerProvider(resource=resource)
+        # Tail sampling needs every span recorded so it can see errors and
+        # slow spans; it then drops the uninteresting traces itself.
+        # Otherwise (sampler=None) the SDK reads OTEL_TRACES_SAMPLER(_ARG).
+        sampler = None
+        if TRACE_TAIL_SAMPLING_ENABLED:
+            sampler = ParentBased(ALWAYS_ON)
+            configured = os.getenv("OTEL_TRACES_SAMPLER", "").strip().lower()
+            if configured and configured != "parentbased_always_on":
+                logger.warning(
+                    f"⚠️ OTEL_TRACES_SAMPLER={configured} is ignored: tail sampling "
+                    f"(TRACE_TAIL_SAMPLING_ENABLED) requires parentbased_always_on"
+                )
+        provider = TracerProvider(resource=resource, sampler=sampler)
+        logger.info(f"🎯 Head sampler: {provider.sampler.get_description()}"
+                    f"{' + tail sampling' if TRACE_TAIL_SAMPLING_ENABLED else ''}")
         
         logger.info(f"🔌 Configuring OTLP Exporter")
         # Use OTLP gRPC exporter
         otlp_exporter = OTLPSpanExporter(
-            endpoint="jaeger:4317",
-            insecure=True
+            endpoint=OTLP_ENDPOINT,
+            insecure=not OTLP_ENDPOINT.startswith("https://")
         )
         
         logger.info(f"➕ Adding BatchSpanProcessor")
         # Add Span Processor
-        provider.add_span_processor(
-            BatchSpanProcessor(otlp_exporter)
-        )
+        span_processor = BatchSpanProcessor(otlp_exporter)
+        if TRACE_TAIL_SAMPLING_ENABLED:
+            span_processor = TailSamplingSpanProcessor(span_processor)
+        provider.add_span_processor(span_processor)
         
         logger.info(f"🔄 Setting global TracerProvider")
         # Set the global TracerProvider
@@ -114,22 +153,45 @@ def setup_telemetry(service_name=None):
         
         _telemetry_initialized = True
         
-        # Create a test span to verify tracing works
-        logger.info(f"🧪 Creating test span")
-        tracer = get_tracer("telemetry_setup")
-        with tracer.start_as_current_span("telemetry_test_span") as span:
-            span.set_attribute("test.attribute", "test-value")
-            span.set_attribute("service.name", actual_service_name)
-            logger.info("✅ Created test span during telemetry setup")
-            # Sleep briefly to allow span to be exported
-            time.sleep(0.5)
-        
         logger.info(f"✅ OpenTelemetry setup complete for {actual_service_name}")
         return True
     except Exception as e:
         logger.error(f"❌ Error setting up OpenTelemetry: {e}", exc_info=True)
         return False
 
+def check_exporter_connectivity(endpoint, timeout=1.0):
+    """Try a TCP connection to the OTLP endpoint and log the outcome."""
+    parsed = urlparse(endpoint if "://" in endpoint else f"//{endpoint}")
+    host, port = parsed.hostname, parsed.port or 4317
+    try:
+        logger.info(f"🌐 Testing network connectivity to OTLP endpoint {host}:{port}...")
+        with socket.create_connection((host, port), timeout=timeout):
+            pass
+        logger.info("✅ Network connection to OTLP endpoint successful")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Failed to connect to OTLP endpoint {host}:{port}: {e}")
+        return False
+
 def get_tracer(name):
     """Get a tracer with the given name"""
-    return trace.get_tracer(name)
\ No newline at end of file
+    return trace.get_tracer(name)
+
+def span_enabled(level):
+    """True if spans of this verbosity level are created."""
+    return _SPAN_LEVELS[SPAN_VERBOSITY] >= _SPAN_LEVELS[level]
+
+@contextmanager
+def start_span(tracer, name, level=SPAN_STANDARD, **kwargs):
+    """
+    start_as_current_span() gated by SPAN_VERBOSITY.
+
+    When the level is disabled no span is created and the enclosing span is
+    yielded instead, so attributes and error status set by the caller are
+    folded into the nearest recorded span (ultimately the server span).
+    """
+    if span_enabled(level):
+        with tracer.start_as_current_span(name, **kwargs) as span:
+            yield span
+    else:
+        yield trace.get_current_span()
\ No newline at end of file
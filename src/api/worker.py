@@ -1,13 +1,17 @@
 from celery import Celery
-import psycopg2
 import os
 import json
 import logging
 import pika
 from time import sleep, time
-from prometheus_client import Counter, Histogram, push_to_gateway
+from prometheus_client import REGISTRY, Counter, Histogram
 import socket
-from api.telemetry import setup_telemetry, get_tracer
+from api.telemetry import setup_telemetry, get_tracer, start_span
+from api.pg_pool import WorkerConnectionPool
+from api.metrics_pusher import MetricsPusher
+from api.metrics import trace_tail_sampling_decisions_total
+from celery.signals import worker_process_init, worker_process_shutdown
+from celery_batches import Batches
 from opentelemetry.instrumentation.celery import CeleryInstrumentor
 
 # Logging Setup
@@ -28,6 +32,10 @@ POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'password')
 POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
 POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
 PROMETHEUS_PUSHGATEWAY = os.getenv('PROMETHEUS_PUSHGATEWAY', 'localhost:9091')
+# Batching consumer for process_order: 1 handles one message per task
+WORKER_ORDER_BATCH_SIZE = int(os.getenv('WORKER_ORDER_BATCH_SIZE', '1'))
+WORKER_ORDER_BATCH_INTERVAL_MS = float(os.getenv('WORKER_ORDER_BATCH_INTERVAL_MS', '200'))
+PROCESS_ORDER_MAX_RETRIES = 3
 
 # Prometheus metrics
 TASK_COUNT = Counter(
@@ -49,6 +57,16 @@ TASK_DURATION = Histogram(
     buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
 )
 
+ORDER_BATCH_SIZE = Histogram(
+    'celery_order_batch_size',
+    'Number of process_order messages handled per batch',
+    buckets=[1, 5, 10, 25, 50, 100, 250, 500]
+)
+
+# Tail sampling runs in the worker too; its counter lives on the API's
+# registry, so add it to the default one that the Pushgateway pushes send
+REGISTRY.register(trace_tail_sampling_decisions_total)
+
 # Celery Configuration
 celery_app = Celery(
     "kodekloud_record_store_worker",
@@ -67,6 +85,9 @@ celery_app.conf.update(
     timezone='UTC',
     enable_utc=True,
 )
+if WORKER_ORDER_BATCH_SIZE > 1:
+    # A batch can only fill from messages the worker has prefetched
+    celery_app.conf.worker_prefetch_multiplier = WORKER_ORDER_BATCH_SIZE
 
 # Database Connection
 DB_CONFIG = {
@@ -77,25 +98,59 @@ DB_CONFIG = {
     "port": POSTGRES_PORT
 }
 
-def get_db_connection():
-    try:
-        return psycopg2.connect(**DB_CONFIG)
-    except Exception as e:
-        logger.error(f"Database connection error: {e}")
-        raise
+# One pool per worker process, created after fork (see pg_pool)
+_db_pool = None
 
-def push_metrics():
-    """Push metrics to Prometheus Pushgateway"""
+def get_db_pool():
+    global _db_pool
+    if _db_pool is None or _db_pool.pid != os.getpid():
+        try:
+            _db_pool = WorkerConnectionPool(DB_CONFIG)
+        except Exception as e:
+            logger.error(f"Database connection error: {e}")
+            raise
+    return _db_pool
+
+@worker_process_init.connect
+def init_db_pool(**kwargs):
+    # Drop any pool inherited from the parent and open this child's own
+    global _db_pool
+    _db_pool = None
     try:
-        hostname = socket.gethostname()
-        push_to_gateway(
-            PROMETHEUS_PUSHGATEWAY, 
+        get_db_pool()
+    except Exception:
+        # process_order retries lazily once the database is reachable
+        pass
+
+@worker_process_shutdown.connect
+def close_db_pool(**kwargs):
+    if _db_pool is not None and _db_pool.pid == os.getpid():
+        _db_pool.close()
+
+# One pusher thread per worker process, started after fork (see metrics_pusher)
+_metrics_pusher = None
+
+def get_metrics_pusher():
+    global _metrics_pusher
+    if _metrics_pusher is None or _metrics_pusher.pid != os.getpid():
+        _metrics_pusher = MetricsPusher(
+            PROMETHEUS_PUSHGATEWAY,
             job='celery_worker',
-            grouping_keys={'instance': hostname}
+            # Each prefork child pushes its own registry; a PUT replaces the
+            # whole group, so children sharing a key would overwrite each
+            # other. Sum over `pid` in queries to get per-host totals.
+            grouping_key={'instance': socket.gethostname(), 'pid': str(os.getpid())}
         )
-        logger.debug("Metrics pushed to Pushgateway")
-    except Exception as e:
-        logger.error(f"Failed to push metrics: {e}")
+    return _metrics_pusher
+
+def push_metrics():
+    """Schedule a push to Prometheus Pushgateway without blocking the task"""
+    get_metrics_pusher().mark_dirty()
+
+@worker_process_shutdown.connect
+def flush_metrics(**kwargs):
+    if _metrics_pusher is not None and _metrics_pusher.pid == os.getpid():
+        _metrics_pusher.stop()
 
 # RabbitMQ Connection
 RABBITMQ_QUEUE = "order_queue"
@@ -115,47 +170,82 @@ def consume_orders():
     logger.info("Waiting for orders...")
     channel.start_consuming()
 
-@celery_app.task(name="process_order", bind=True, max_retries=3)
-def process_order(self, order):
-    with tracer.start_as_current_span("process_order_task"):
+def _transition_orders(cur, order_ids):
+    """
+    Move orders pending -> processed in place and report each one.
+
+    The API already inserted the orders (and checked their products), so a
+    single UPDATE ... RETURNING both validates and persists the whole set.
+    The status guard makes redelivered or repeated messages a no-op. Only
+    ids the UPDATE did not match are looked up, to tell a missing order
+    from one that was already processed.
+
+    Returns {order_id: result} with result["status"] one of "processed",
+    the order's existing status (skipped), or "failed".
+    """
+    cur.execute(
+        "UPDATE orders SET status = 'processed' WHERE id = ANY(%s) AND status = 'pending' RETURNING id",
+        (list(order_ids),)
+    )
+    processed = {row[0] for row in cur.fetchall()}
+    unmatched = [order_id for order_id in order_ids if order_id not in processed]
+    existing = {}
+    if unmatched:
+        cur.execute("SELECT id, status FROM orders WHERE id = ANY(%s)", (unmatched,))
+        existing = dict(cur.fetchall())
+
+    results = {}
+    for order_id in order_ids:
+        if order_id in processed:
+            results[order_id] = {"order_id": order_id, "status": "processed"}
+        elif order_id in existing:
+            results[order_id] = {"order_id": order_id, "status": existing[order_id]}
+        else:
+            results[order_id] = {"order_id": order_id, "status": "failed", "reason": "order_not_found"}
+    return results
+
+def _count_result(task_name, result):
+    if result["status"] == "processed":
+        TASK_COUNT.labels(task_name=task_name, status='success').inc()
+    elif result["status"] == "failed":
+        if "order_id" in result:
+            logger.error(f"Order {result['order_id']} not processed: {result['reason']}")
+        else:
+            logger.error("Order message without order_id, cannot process")
+        TASK_COUNT.labels(task_name=task_name, status='failed').inc()
+    else:
+        logger.info(f"Order {result['order_id']} already {result['status']}, skipping")
+        TASK_COUNT.labels(task_name=task_name, status='skipped').inc()
+
+# Published by an API version that did not send the order id
+_MISSING_ORDER_ID = {"status": "failed", "reason": "missing_order_id"}
+
+def _process_order(self, order):
+    with start_span(tracer, "process_order_task"):
         task_name = 'process_order'
         start_time = time()
         
         logger.info(f"Processing order: {order}")
         
+        order_id = order.get("order_id")
+        if order_id is None:
+            _count_result(task_name, _MISSING_ORDER_ID)
+            push_metrics()
+            return _MISSING_ORDER_ID
+
         try:
             # Simulate processing time
             sleep(2)
             
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            # First check if product exists and has enough inventory
-            cur.execute("SELECT id, name FROM products WHERE id = %s", (order["product_id"],))
-            product = cur.fetchone()
-            
-            if not product:
-                logger.error(f"Product {order['product_id']} not found")
-                TASK_COUNT.labels(task_name=task_name, status='failed').inc()
-                push_metrics()
-                return {"status": "failed", "reason": "product_not_found"}
-            
-            # Insert the order
-            cur.execute(
-                "INSERT INTO orders (product_id, quantity, status) VALUES (%s, %s, %s) RETURNING id",
-                (order["product_id"], order["quantity"], "processed")
-            )
-            order_id = cur.fetchone()[0]
-            conn.commit()
-            
-            logger.info(f"Order {order_id} processed successfully")
-            
-            # Record successful task execution
-            TASK_COUNT.labels(task_name=task_name, status='success').inc()
+            with get_db_pool().connection() as conn, conn.cursor() as cur:
+                result = _transition_orders(cur, [order_id])[order_id]
+                conn.commit()
+
+            _count_result(task_name, result)
             TASK_DURATION.labels(task_name=task_name).observe(time() - start_time)
             push_metrics()
             
-            return {"order_id": order_id, "status": "processed"}
+            return result
             
         except Exception as e:
             logger.error(f"Error processing order: {e}")
@@ -171,10 +261,79 @@ def process_order(self, order):
             
             # Retry the task if it fails
             self.retry(exc=e, countdown=5)
-        finally:
-            if 'conn' in locals() and conn:
-                cur.close()
-                conn.close()
+
+def _process_order_batch(requests):
+    """
+    Batched process_order: one connection, one UPDATE and one commit for up
+    to WORKER_ORDER_BATCH_SIZE messages, with a result stored per message.
+    """
+    with start_span(tracer, "process_order_batch") as span:
+        task_name = 'process_order'
+        start_time = time()
+        span.set_attribute("batch.size", len(requests))
+        ORDER_BATCH_SIZE.observe(len(requests))
+        logger.info(f"Processing batch of {len(requests)} orders")
+
+        orders = {request.id: request.args[0] for request in requests}
+        order_ids = list(dict.fromkeys(
+            order["order_id"] for order in orders.values() if order.get("order_id") is not None
+        ))
+
+        try:
+            results = {}
+            if order_ids:
+                # Simulate processing time (once per batch)
+                sleep(2)
+
+                with get_db_pool().connection() as conn, conn.cursor() as cur:
+                    results = _transition_orders(cur, order_ids)
+                    conn.commit()
+        except Exception as e:
+            logger.error(f"Error processing order batch: {e}")
+            # Every message in the batch failed this attempt; count them the
+            # way the per-message task does, once per failed attempt
+            TASK_COUNT.labels(task_name=task_name, status='failed').inc(len(requests))
+            TASK_FAILURE.labels(task_name=task_name, exception_type=type(e).__name__).inc(len(requests))
+            TASK_DURATION.labels(task_name='process_order_batch').observe(time() - start_time)
+            # Nothing was committed; send each message back individually,
+            # like the per-message task's retry (max 3 attempts, 5s apart)
+            for request in requests:
+                order = orders[request.id]
+                attempt = order.get("attempt", 0) + 1
+                if attempt <= PROCESS_ORDER_MAX_RETRIES:
+                    # The retry is a new message with a new task id; this id
+                    # stays in RETRY and never reaches a final state
+                    process_order.apply_async(args=[{**order, "attempt": attempt}], countdown=5)
+                    celery_app.backend.mark_as_retry(request.id, e, request=request)
+                else:
+                    celery_app.backend.mark_as_failure(request.id, e, request=request)
+            push_metrics()
+            return
+
+        for request in requests:
+            order_id = orders[request.id].get("order_id")
+            result = _MISSING_ORDER_ID if order_id is None else results[order_id]
+            _count_result(task_name, result)
+            celery_app.backend.mark_as_done(request.id, result, request=request)
+
+        span.set_attribute("batch.orders", len(order_ids))
+        TASK_DURATION.labels(task_name='process_order_batch').observe(time() - start_time)
+        push_metrics()
+
+if WORKER_ORDER_BATCH_SIZE > 1:
+    # Batching consumer: collect up to WORKER_ORDER_BATCH_SIZE process_order
+    # messages or WORKER_ORDER_BATCH_INTERVAL_MS, whichever comes first.
+    # Publishers are unchanged: the message name and payload are the same.
+    process_order = celery_app.task(
+        name="process_order",
+        base=Batches,
+        flush_every=WORKER_ORDER_BATCH_SIZE,
+        flush_interval=WORKER_ORDER_BATCH_INTERVAL_MS / 1000,
+    )(_process_order_batch)
+else:
+    process_order = celery_app.task(
+        name="process_order", bind=True, max_retries=PROCESS_ORDER_MAX_RETRIES
+    )(_process_order)
 
 # Additional tasks can be defined here
 @celery_app.task(name="send_order_confirmation")
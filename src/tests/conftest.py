@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the `api` package importable when running `pytest src/tests/` from the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
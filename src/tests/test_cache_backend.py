@@ -0,0 +1,91 @@
+"""RedisCacheBackend against fakeredis: catalog versions and the shared page tier."""
+
+import fakeredis.aioredis
+import pytest
+
+from api.cache import CatalogPage, SingleFlightCache, VersionCounter, decode_catalog_page, encode_catalog_page
+from api.cache_backend import RedisCacheBackend
+from api.metrics import METRICS_REGISTRY
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def redis_backend(server):
+    # One client per "replica", all talking to the same fake server
+    return RedisCacheBackend(namespace="test", client=fakeredis.aioredis.FakeRedis(server=server))
+
+def shared_lookups(result):
+    return METRICS_REGISTRY.get_sample_value(
+        "kodekloud_cache_requests_total", {"cache": "test_page_shared", "result": result}
+    ) or 0
+
+def page_cache(backend):
+    return SingleFlightCache(
+        "test_page",
+        max_entries=10,
+        ttl=60,
+        backend=backend,
+        shared_ttl=60,
+        encode=encode_catalog_page,
+        decode=decode_catalog_page,
+    )
+
+@pytest.mark.asyncio
+async def test_version_counter_bump_is_seen_by_every_replica(server):
+    a = VersionCounter("catalog", redis_backend(server))
+    b = VersionCounter("catalog", redis_backend(server))
+
+    version = await a.current()
+    assert await b.current() == version
+
+    bumped = await b.bump()
+    assert bumped == version + 1
+    assert await a.current() == bumped
+    assert a.etag(bumped) == f'"catalog-{bumped}"'
+
+@pytest.mark.asyncio
+async def test_single_flight_cache_shares_pages_between_replicas(server):
+    version = await VersionCounter("catalog", redis_backend(server)).current()
+    page = CatalogPage(b'[{"id":1}]', 1, None, '"catalog-1"')
+    fetches = []
+
+    async def fetch():
+        fetches.append(1)
+        return page
+
+    first, second = page_cache(redis_backend(server)), page_cache(redis_backend(server))
+
+    # Shared-tier miss: the first replica loads the page and stores it
+    assert await first.get_or_fetch((0, 100), version, fetch) == (page, "miss")
+    assert shared_lookups("miss") == 1
+    # Shared-tier hit: the second replica reads it instead of fetching
+    assert await second.get_or_fetch((0, 100), version, fetch) == (page, "miss")
+    assert shared_lookups("hit") == 1
+    assert len(fetches) == 1
+    # In-process hit afterwards
+    assert await second.get_or_fetch((0, 100), version, fetch) == (page, "hit")
+
+    # A new version is a new shared key
+    assert await second.get_or_fetch((0, 100), version + 1, fetch) == (page, "miss")
+    assert len(fetches) == 2
+
+@pytest.mark.asyncio
+async def test_version_counter_falls_back_while_redis_is_down(server):
+    backend = redis_backend(server)
+    counter = VersionCounter("catalog", backend)
+    version = await counter.current()
+
+    server.connected = False
+    # Same version (and ETag) as before the outage; one failure opens the breaker
+    assert await counter.current() == version
+    assert not backend.available()
+    # Local writes still change the version
+    assert await counter.bump() == version + 1
+
+    server.connected = True
+    backend.mark_up()
+    # Redis is moved past the local version, so every replica sees the write
+    recovered = await counter.current()
+    assert recovered > version + 1
+    assert await VersionCounter("catalog", redis_backend(server)).current() == recovered